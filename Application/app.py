@@ -1,11 +1,22 @@
-import os
-import json
 import time
-from bs4 import BeautifulSoup
+# Taken before the heavy imports so the sidebar can show how long the script took to draw the UI
+script_started = time.perf_counter()
+import os
+import re
+import threading
+import uuid
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from dotenv import load_dotenv
-from prompts import *
-from helpers import *
+# Nothing heavy is built by these imports: models, caches, Splunk clients and the vector
+# store are created on first use and then shared by every rerun and session of the process
+from helpers import (get_field_catalog, get_llm_cache, get_splunk_inventory, handle_spl_merge_agent,
+                     handle_spl_results_agent, handle_splunk_executor_agent, token_budget)
+import instrumentation
+import pipeline
+from scheduler import TaskScheduler
+from state_store import StateStore, state_key
+from task_store import DONE, FAILED, RUNNING, TaskStore
 
 
 # Configuration and environment setup
@@ -13,199 +24,249 @@ load_dotenv()
 serper_api_key = os.getenv("SERP_API_KEY")
 openai_api_key = os.getenv("OPENAI_API_KEY")
 brwoserless_api_key = os.getenv("BROWSERLESS_API_KEY")
-# os.environ["LANGCHAIN_TRACING_V2"] = "true"
-# os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
-# os.environ["LANGCHAIN_PROJECT"] = "SplunkGPT"
-# os.environ["LANGCHAIN_API_KEY"] = ""
-
-
-# Path to the state JSON file
-STATE_FILE = os.path.join(os.getcwd(), "state.json")
-
-def load_state():
-    """Load the current state from the JSON file."""
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, 'r') as file:
-            return json.load(file)
-    # return a default state if no file exists
-    return {
-        'initial_setup_done': False,
-        'user_has_responded': False,
-        'spl_command_updated': False,
-        'prompted_for_input': False,
-        'spl_processed': False,
-        'display_spl': False,
-        'spl_command': "",
-        'updated_spl_command': "",
-    }
-
-def save_state(state):
-    """Save the current state to the JSON file."""
-    with open(STATE_FILE, 'w') as file:
-        json.dump(state, file)
-
-# Path to the local JSON file
-TASK_LIST_FILE = os.path.join(os.getcwd(), "task_list.json")
-
-def update_task_list(task, task_list_json):
-    # st.markdown(f"### Before removal: Number of tasks in task_list_json = **{len(task_list_json)}**")
-    # st.markdown(f"### Attempting to remove task with id = **{task['id']}** and description = **{task['description']}**")
-    task_list_json.remove(task)
-    # st.markdown(f"### After removal: Number of tasks in task_list_json = **{len(task_list_json)}**")
-    with open(TASK_LIST_FILE, 'w') as file:
-        json.dump(task_list_json, file)
-        
-def load_task_list():
-    """Load the task list from the JSON file."""
-    if os.path.exists(TASK_LIST_FILE):
-        with open(TASK_LIST_FILE, 'r') as file:
-            return json.load(file)
-    return []
-
-def save_task_list(task_list_json):
-    """Save the task list to the JSON file."""
-    with open(TASK_LIST_FILE, 'w') as file:
-        json.dump(task_list_json, file)
+
+
+# Defaults for a session/objective seen for the first time
+DEFAULT_STATE = {
+    'initial_setup_done': False,
+    'user_has_responded': False,
+    'awaiting_review': False,
+    'spl_processed': False,
+    'spl_command': "",
+    'updated_spl_command': "",
+    'research': "",
+    'splunk_info': "",
+    'schema': {},
+}
+
+@st.cache_resource
+def get_state_store():
+    """One StateStore per server process, shared by every session (hot states stay in memory across reruns)."""
+    return StateStore(defaults=DEFAULT_STATE)
+
+@st.cache_resource(max_entries=256)
+def get_task_store(plan_id):
+    """The TaskStore for one session/objective key."""
+    return TaskStore(plan_id=plan_id)
+
+def session_id():
+    """
+    Durable id for this analyst, kept in the ?session= query parameter.
+
+    st.session_state is lost on a reload or server restart; the URL is not, so reopening
+    (or bookmarking) it reaches the persisted state and task plan again.
+    """
+    if "session" not in st.query_params:
+        st.query_params["session"] = uuid.uuid4().hex
+    return st.query_params["session"]
+
+def approve_review(key, task_id):
+    """Form submit callback: store the reviewed SPL so executor task task_id can run on the next rerun."""
+    state_store = get_state_store()
+    state = state_store.load(key)
+    state['updated_spl_command'] = st.session_state[f"review_spl_{key}_{task_id}"]
+    state['user_has_responded'] = True
+    state['awaiting_review'] = False
+    state_store.save(key, state)
+
+def start_task(task_store, task):
+    """Mark task running (once) before its agent is called."""
+    if task.get("state") != RUNNING:
+        task_store.mark(task["id"], RUNNING)
+        task["state"] = RUNNING
+
+def complete_task(task_store, task, result=None, state=DONE):
+    """Record task's outcome (done with its SPL, or failed with the error)."""
+    task_store.mark(task["id"], state, result=result)
 
 # Streamlit UI setup
 st.title("⛓🦖 **SplunkGPT** 🧩⛓")
 local = st.sidebar.checkbox('Search Local Vector Datastore ', value=False)
+if st.sidebar.button('Invalidate Field Catalog'):
+    st.sidebar.write(f"Removed {get_field_catalog().invalidate()} cached field schemas")
+if st.sidebar.button('Rebuild Splunk Inventory'):
+    get_splunk_inventory().refresh(full=True)
+if get_llm_cache.built():
+    cache_stats = get_llm_cache().stats()
+    st.sidebar.caption(f"LLM cache: {cache_stats['hits']} hits ({cache_stats['semantic_hits']} semantic), "
+                       f"{cache_stats['misses']} misses, {cache_stats['entries']} entries")
+with st.sidebar.expander("Token usage per chain"):
+    st.table([{"chain": name, **usage} for name, usage in token_budget.usage.items()])
 user_input = st.text_input("Write a Splunk Query to detect <insert below> in my Windows Domain:")
+st.sidebar.caption(f"UI ready in {time.perf_counter() - script_started:.2f}s")
 
 def perform_research():
-    prefix = "Local Search " if local else "Internet Search "
-    agent_kwargs = {"system_message": research_system_template,}
-    research_chain = initialize_agent(research_tools,llm, agent=AgentType.OPENAI_FUNCTIONS, verbose=False, agent_kwargs=agent_kwargs)
-    research_question = f"{prefix} for current detection procedures that detects {user_input} using Windows Security logs"
-    print(f"==== DEBUG === research_question= {research_question}")
-    return research_chain({"input": research_question})['output']
+    return pipeline.perform_research(user_input, local=local)
 
-def gather_splunk_info():
-    search_query = "| tstats values(source) as source by index"
-    data = run_splunk_search(search_query)
-    data = """
-    index [main], 
-    source [WinEventLog:Application, WinEventLog:Security, WinEventLog:Setup, WinEventLog:System],
-    sourcetype [WinEventLog]
+def splunk_progress_reporter(label):
     """
-    return [result for result in data]
+    Return an on_progress callback that draws one progress bar per Splunk search, created on its first update.
+
+    label is a string, or a callable(index, query) for callers that run a batch of searches.
+    """
+    bars = {}
+
+    def on_progress(index, query, progress):
+        if query not in bars:
+            bars[query] = (st.progress(0.0), label(index, query) if callable(label) else label)
+        bar, text = bars[query]
+        bar.progress(
+            min(progress.get("doneProgress", 0.0), 1.0),
+            text=f"{text}: {progress.get('dispatchState', '')} "
+                 f"scanned={progress.get('scanCount', 0)} events={progress.get('eventCount', 0)}")
+    return on_progress
+
+def gather_splunk_info():
+    """Compact summary of the cached Splunk inventory (refreshed incrementally when older than INVENTORY_TTL)."""
+    summary = pipeline.gather_splunk_info(on_progress=splunk_progress_reporter("Splunk inventory (tstats)"))
+    inventory_error = get_splunk_inventory().error
+    if inventory_error:
+        st.markdown(f"<span style='color: red;'>Inventory refresh failed: {inventory_error}</span>", unsafe_allow_html=True)
+    return summary
 
 def gather_schema_info(content):
-    schema = {}
-    event_id_chain = LLMChain(llm=llm, prompt=event_id_prompt, verbose=False)
-    items = event_id_chain.run(content)[1:-1].split(', ')
-    for event_code in items:
-        st.write(f"<span style='color: blue;'>Gathering Splunk fields for EventCode </span>{event_code} <span style='color: blue;'>...</span>", unsafe_allow_html=True)
-        search_query = f'search index="main" EventCode={event_code} | fieldsummary |table field '
-        field_data = run_splunk_search(search_query)
-        all_fields = [field_name for fields in field_data if isinstance(fields, dict) for field_name in fields.values()]
-        schema[event_code] = all_fields
-    return schema
+    event_codes = pipeline.extract_event_codes(content)
+    st.write(f"<span style='color: blue;'>Gathering Splunk fields for EventCodes </span>{', '.join(event_codes)} <span style='color: blue;'>...</span>", unsafe_allow_html=True)
+    # Only EventCodes missing from the field catalog start searches, so cached runs draw no bars
+    on_progress = splunk_progress_reporter(
+        lambda index, query: "Schema discovery: " + ", ".join(re.findall(r"EventCode(?: IN \(|=)([\d,]+)", query)))
+    return pipeline.gather_schema_info(event_codes, on_progress=on_progress)
 
 def enhance_tasks(objective, actual_content, splunk_info, schema):
-    initial_response = start_chain.run(objective)
-    detial_response = detial_chain.predict(objective=objective,task_list_json=initial_response,detection_procedures=actual_content, splunk_info=splunk_info, schema=schema)
-    context_response = tasks_context_chain.predict(objective=objective,task_list_json=detial_response, detection_procedures=actual_content)
-    return json.loads(context_response)["tasks"]
+    return pipeline.enhance_tasks(objective, actual_content, splunk_info, schema)
 
-def main():
-    current_state = load_state()  # Load the current state from the file
+def show_breakdown(panel, trace):
+    """Redraw the sidebar breakdown: per-stage time, LLM calls and tokens, Splunk cost and I/O recorded so far."""
+    with panel.container():
+        st.subheader("Run breakdown")
+        st.table(trace.breakdown())
+        if trace.path:
+            st.caption(f"Trace: {trace.path}")
+
+def render_splunk_stream(stream):
+    """Show the first page of a SplunkResultStream as soon as it arrives and keep a running row count."""
+    table = st.empty()
+    status = st.empty()
+    rows = []
+    for batch in stream:
+        if not rows:
+            table.dataframe(batch)
+        rows.extend(batch)
+        status.caption(f"{len(rows)} rows received ...")
+    if stream.error:
+        st.error(stream.error)
+    if not rows:
+        table.write("No results")
+    note = " (stopped at row/byte cap)" if stream.truncated else ""
+    status.caption(f"{len(rows)} rows, {stream.bytes_read} bytes in {stream.run_duration:.2f}s{note}")
+    return rows
 
+def main():
     if user_input:
-        objective = f"Build a Splunk SPL Query to detect {user_input} in a windows environment"
+        objective = pipeline.objective_for(user_input)
+        key = state_key(session_id(), objective)
+        state_store = get_state_store()
+        task_store = get_task_store(key)
+        if st.sidebar.button('Start Objective Over'):
+            # drop the stored plan and state so research and planning run again
+            task_store.clear()
+            state_store.delete(key)
+        current_state = state_store.load(key)
+        # Every chain call, Splunk search, web request and file write below is recorded in this objective's trace
+        panel = st.sidebar.empty()
+        with instrumentation.run(key) as trace:
+            show_breakdown(panel, trace)
 
-        if not current_state['initial_setup_done']:
-            st.markdown("<span style='color: blue;'>Researching...</span>", unsafe_allow_html=True)
-            actual_content = perform_research()
-            st.markdown("<span style='color: yellow; font-size: 18px;'> Finished Research ...</span>", unsafe_allow_html=True)
+            if not current_state['initial_setup_done']:
+                st.markdown("<span style='color: blue;'>Researching...</span>", unsafe_allow_html=True)
+                with instrumentation.stage("research"):
+                    actual_content = perform_research()
+                show_breakdown(panel, trace)
+                st.markdown("<span style='color: yellow; font-size: 18px;'> Finished Research ...</span>", unsafe_allow_html=True)
             
-            st.markdown("<span style='color: blue;'>Gathering Splunk Indexes and Sourcetypes...</span>", unsafe_allow_html=True)
-            splunk_info = gather_splunk_info()
-            schema = gather_schema_info(actual_content)
-            st.markdown("<span style='color: yellow; font-size: 18px;'> Completed gathering Splunk information ...</span>", unsafe_allow_html=True)
+                st.markdown("<span style='color: blue;'>Gathering Splunk Indexes and Sourcetypes...</span>", unsafe_allow_html=True)
+                with instrumentation.stage("splunk_info"):
+                    splunk_info = gather_splunk_info()
+                with instrumentation.stage("schema"):
+                    schema = gather_schema_info(actual_content)
+                show_breakdown(panel, trace)
+                st.markdown("<span style='color: yellow; font-size: 18px;'> Completed gathering Splunk information ...</span>", unsafe_allow_html=True)
             
-            st.markdown("<span style='color: blue;'>Adding Details and Context to Each Task...</span>", unsafe_allow_html=True)
-            task_list_json = enhance_tasks(objective, actual_content, splunk_info, schema)
-            save_task_list(task_list_json)
+                st.markdown("<span style='color: blue;'>Adding Details and Context to Each Task...</span>", unsafe_allow_html=True)
+                with instrumentation.stage("enhance_tasks"):
+                    task_list_json = enhance_tasks(objective, actual_content, splunk_info, schema)
+                    task_store.load_plan(task_list_json)
+                show_breakdown(panel, trace)
             
-            current_state['initial_setup_done'] = True
-            save_state(current_state)
-        
-        # MAIN LOOP
-        st.markdown("<span style='color: yellow; font-size: 18px;'> Entering Task Execution Loop ...</span>", unsafe_allow_html=True)
+                current_state.update(research=actual_content, splunk_info=splunk_info, schema=schema)
+                current_state['initial_setup_done'] = True
+                state_store.save(key, current_state)
         
-        spl_command = current_state['spl_command']
-        updated_spl_command = current_state['updated_spl_command']
-        
-        task_list_json = load_task_list()  # Load the tasks from the file
-
-        while task_list_json:  # Keep looping until there are no more tasks
-            task = task_list_json[0]  # Process the first task in the list
-            chosen_agent = task["agent"]
-
-            if chosen_agent == "splunk_executor_agent":
-                spl_command = current_state['spl_command']
-
-                # If SPL hasn't been displayed, show it
-                if not current_state['display_spl']:
-                    st.markdown("<span style='color: yellow; font-size: 18px;'> Current SPL:</span>", unsafe_allow_html=True)
-                    st.write(current_state['spl_command'])
-                    current_state['display_spl'] = True
-                    current_state['spl_command'] = spl_command
-                    save_state(current_state) 
-                                      
-                # If not prompted before, show the input box
-
-                if not current_state['prompted_for_input']:
-                    updated_spl_command = st.text_input("Please make changes to the command:", spl_command)
-                    time.sleep(30)
-                    current_state['prompted_for_input'] = True
-                    current_state['updated_spl_command'] = updated_spl_command
-                    save_state(current_state)
-
-                
-                if current_state['spl_command'] != current_state['updated_spl_command']:   
-                    current_state['spl_command_updated'] = True
-                    save_state(current_state)
-                    
-                if current_state['spl_command_updated']:
-                    #st.markdown(f"<span style='color: yellow; font-size: 18px;'> DEBUG spl_command_updated {current_state['updated_spl_command']} DEGBU ...</span>", unsafe_allow_html=True)
-                    splunk_results = handle_splunk_executor_agent(task, current_state['updated_spl_command'])    
+            # MAIN LOOP
+            st.markdown("<span style='color: yellow; font-size: 18px;'> Entering Task Execution Loop ...</span>", unsafe_allow_html=True)
+
+            actual_content = current_state['research']
+            splunk_info = current_state['splunk_info']
+            schema = current_state['schema']
+
+            def run_task(task, spl_command):
+                chosen_agent = task["agent"]
+                if chosen_agent == "splunk_executor_agent":
+                    # Review checkpoint: render the form, persist that we are waiting and end this run.
+                    # approve_review() records the analyst's SPL and the next run continues from here.
+                    if not current_state['user_has_responded']:
+                        if not current_state['awaiting_review']:
+                            current_state['awaiting_review'] = True
+                            state_store.save(key, current_state)
+                        st.markdown("<span style='color: yellow; font-size: 18px;'> Current SPL:</span>", unsafe_allow_html=True)
+                        st.code(spl_command)
+                        with st.form(f"review_{key}_{task['id']}"):
+                            # one widget per task, so a later review does not show the SPL of an earlier one
+                            st.text_area("Please make changes to the command:", spl_command, key=f"review_spl_{key}_{task['id']}")
+                            st.form_submit_button("Run search", on_click=approve_review, args=(key, task['id']))
+                        st.stop()
+
+                    updated_spl_command = current_state['updated_spl_command']
                     st.markdown("<span style='color: yellow; font-size: 18px;'> Splunk Results</span>", unsafe_allow_html=True)
-                    st.write(splunk_results)
+                    splunk_results = render_splunk_stream(handle_splunk_executor_agent(task, updated_spl_command))
                     st.markdown("<span style='color: yellow; font-size: 18px;'> Splunk Result Analysis</span>", unsafe_allow_html=True)
                     st.write(handle_spl_results_agent(objective, updated_spl_command, splunk_results))
+                    # the reviewed SPL becomes the draft; a later executor task asks for a new review
+                    current_state['user_has_responded'] = False
+                    state_store.save(key, current_state)
+                    return updated_spl_command
+                if chosen_agent in pipeline.AGENT_STATUS:
+                    st.markdown(f"<span style='color: blue;'>{pipeline.AGENT_STATUS[chosen_agent]}</span>", unsafe_allow_html=True)
+                return pipeline.run_agent_task(task, spl_command, objective, actual_content, splunk_info, schema)
+
+            # Independent tasks run on worker threads that share this session's UI context
+            ctx = get_script_run_ctx()
+            scheduler = TaskScheduler(run_task, is_barrier=lambda task: task["agent"] == "splunk_executor_agent",
+                                      initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+                                      merge=lambda task, drafts: handle_spl_merge_agent(task, objective, drafts))
 
-                    update_task_list(task, task_list_json)
-                    task_list_json = load_task_list()
-
-
-            elif chosen_agent == "spl_writer_agent":
-                spl_command = handle_spl_writer_agent(task, objective,schema,splunk_info)
-                #print(f"=== DEBUG ===\n\nspl_writer_agent={spl_command}\n\n=== DEBUG ===")
-                update_task_list(task, task_list_json)
-                task_list_json = load_task_list()            
-            elif chosen_agent == 'spl_filter_agent':
-                st.markdown("<span style='color: blue;'>Entering spl_filter_agent logic...</span>", unsafe_allow_html=True)
-                spl_command = handle_spl_filter_agent(task, objective, spl_command)
-                #print(f"=== DEBUG ===\n\nspl_filter_agent={spl_command}\n\n=== DEBUG ===")
-                update_task_list(task, task_list_json)
-                task_list_json = load_task_list()            
-            elif chosen_agent == "spl_statistical_analysis_agent":
-                spl_command = handle_spl_statistical_analysis_agent(task, objective, spl_command)
-                #print(f"=== DEBUG ===\n\nspl_statistical_analysis_agent={spl_command}\n\n=== DEBUG ===")
-                update_task_list(task, task_list_json)
-                task_list_json = load_task_list()
-            elif chosen_agent == "spl_refactor_agent":
-                spl_command = handle_spl_refactor_agent(task, objective, spl_command, splunk_info, schema)
-                #print(f"=== DEBUG ===\n\nspl_refactor_agent={spl_command}\n\n=== DEBUG ===")
-                update_task_list(task, task_list_json)
-                task_list_json = load_task_list()
-            else:
-                #st.markdown(f"<span style='color: red;'>Unknown agent: {chosen_agent}</span>", unsafe_allow_html=True)
-                update_task_list(task, task_list_json)
-                task_list_json = load_task_list()
+            # Resume: pending tasks (and any left running by an interrupted run) run again; the
+            # others only feed their recorded drafts to their dependents
+            all_tasks = task_store.tasks()
+            to_run = {task["id"] for task in task_store.pending()}
+            finished = {task["id"]: task["result"] if task["state"] == DONE else None
+                        for task in all_tasks if task["id"] not in to_run}
+            progress = st.progress(len(finished) / max(len(all_tasks), 1), text=f"{len(finished)}/{len(all_tasks)} tasks done")
+            with instrumentation.stage("tasks"):
+                for task, spl_command, result, error in scheduler.run(all_tasks, finished, on_start=lambda task, spl: start_task(task_store, task)):
+                    if error:
+                        st.error(f"Task {task['id']} ({task['agent']}) failed: {error}")
+                        complete_task(task_store, task, str(error), state=FAILED)
+                    else:
+                        complete_task(task_store, task, result)
+                    finished[task["id"]] = result
+                    progress.progress(len(finished) / len(all_tasks), text=f"{len(finished)}/{len(all_tasks)} tasks done")
 
+                    # Keep the latest draft with the state
+                    current_state['spl_command'] = result or spl_command
+                    state_store.save(key, current_state)
+                    show_breakdown(panel, trace)
+            show_breakdown(panel, trace)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,145 @@
+'''
+Run many detection objectives headless and write one JSONL record per objective.
+
+Usage:
+    python batch.py objectives.jsonl --output results.jsonl [--workers N]
+                    [--llm-concurrency N] [--splunk-concurrency N] [--local] [--no-execute]
+
+Each input line is {"id": ..., "objective": "..."} (or just a JSON string). Objectives
+run on a thread pool. LLM calls and Splunk jobs are capped globally by
+LLM_MAX_CONCURRENCY and SPLUNK_MAX_CONCURRENT_JOBS, whatever the number of workers.
+Records are appended and flushed as each objective finishes. A rerun skips ids that
+already have a successful record, so an interrupted batch resumes where it stopped.
+Each record carries a per-stage cost breakdown, and the objective's spans are written to
+TRACE_DIR/batch-<id>.jsonl.
+'''
+# Standard Libraries
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# .env for environment variables
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def read_objectives(path: str) -> list:
+    """(id, objective) pairs from a JSONL file; ids default to a hash of the objective."""
+    objectives = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"objective": record}
+            text = record["objective"].strip()
+            objective_id = str(record.get("id") or hashlib.sha1(text.lower().encode("utf-8")).hexdigest()[:12])
+            objectives.append((objective_id, text))
+    return objectives
+
+
+def completed_ids(path: str) -> set:
+    """Ids with a successful record in an existing output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # a line cut short by a crash; that objective is simply run again
+                continue
+            if not record.get("error"):
+                done.add(str(record.get("id")))
+    return done
+
+
+class ResultWriter:
+    """Appends one JSON line per result, flushed and fsynced so a crash loses at most the line in progress."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, record: dict):
+        with self._lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run SplunkGPT headless for every objective in a JSONL file.")
+    parser.add_argument("input", help="JSONL file of objectives")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=4, help="Objectives processed at once")
+    parser.add_argument("--llm-concurrency", type=int, default=None, help="LLM calls in flight across all objectives")
+    parser.add_argument("--splunk-concurrency", type=int, default=None, help="Splunk jobs in flight across all objectives")
+    parser.add_argument("--local", action="store_true", help="Also search the local vector store during research")
+    parser.add_argument("--no-execute", action="store_true", help="Write the SPL without running it against Splunk")
+    args = parser.parse_args(argv)
+
+    # The shared limiters are built when helpers is imported, so the caps go in first
+    if args.llm_concurrency:
+        os.environ["LLM_MAX_CONCURRENCY"] = str(args.llm_concurrency)
+    if args.splunk_concurrency:
+        os.environ["SPLUNK_MAX_CONCURRENT_JOBS"] = str(args.splunk_concurrency)
+    import instrumentation
+    import pipeline
+    from helpers import token_budget
+
+    objectives = read_objectives(args.input)
+    done = completed_ids(args.output)
+    todo = [(objective_id, text) for objective_id, text in objectives if objective_id not in done]
+    print(f"{len(objectives)} objectives, {len(objectives) - len(todo)} already done, {len(todo)} to run")
+
+    def run(objective_id, text):
+        start = time.perf_counter()
+        record = {"id": objective_id, "input": text}
+        try:
+            with instrumentation.run(f"batch-{objective_id}") as trace:
+                record["trace"] = trace.path
+                record.update(pipeline.run_objective(text, local=args.local, execute=not args.no_execute))
+                record["cost"] = trace.breakdown()
+            record["error"] = None
+        except Exception as e:
+            traceback.print_exc()
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        return record
+
+    writer = ResultWriter(args.output)
+    failed = 0
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(args.workers, 1), thread_name_prefix="objective") as pool:
+            futures = [pool.submit(run, objective_id, text) for objective_id, text in todo]
+            for finished, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                writer.write(record)
+                failed += bool(record["error"])
+                status = "FAILED" if record["error"] else "ok"
+                print(f"[{finished}/{len(todo)}] {record['id']} {status} in {record['seconds']:.1f}s")
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    tokens = sum(usage["prompt_tokens"] + usage["completion_tokens"] for usage in token_budget.usage.values())
+    print(f"Ran {len(todo)} objectives in {elapsed:.1f}s ({failed} failed, {tokens} tokens)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+'''
+Deterministic fake chat model and embeddings behind an OpenAI-compatible HTTP API.
+
+The pipeline's real ChatOpenAI/OpenAIEmbeddings clients are pointed here with
+OPENAI_API_BASE, so the benchmark exercises the same client, callback, cache and
+rate-limit code as production. Each chain's prompt is recognised by a phrase from its
+template, and the answer is canned. Embeddings are pseudo-random unit vectors seeded by
+the input text.
+'''
+# Standard Libraries
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSIONS = 1536
+
+# Planned by the fake research planner; bench/run.py records search and page responses for these
+RESEARCH_QUERIES = [
+    "windows security event log detection procedure",
+    "windows event id field names attack detection",
+]
+
+WRITER_SPL = 'index=main sourcetype="WinEventLog:Security" EventCode=4769 | table _time host Account_Name Service_Name Ticket_Encryption_Type Client_Address'
+FILTER_SPL = 'index=main sourcetype="WinEventLog:Security" EventCode=4769 Ticket_Encryption_Type=0x17 Service_Name!="krbtgt" | table _time host Account_Name Service_Name Client_Address'
+STATS_SPL = 'index=main sourcetype="WinEventLog:Security" EventCode=4769 | stats count dc(Service_Name) as services by Account_Name Client_Address'
+MERGED_SPL = ('index=main sourcetype="WinEventLog:Security" EventCode=4769 Ticket_Encryption_Type=0x17 Service_Name!="krbtgt" '
+              '| stats count dc(Service_Name) as services by Account_Name Client_Address')
+FINAL_SPL = ('index=main sourcetype="WinEventLog:Security" EventCode=4769 Ticket_Encryption_Type=0x17 Service_Name!="krbtgt" '
+             '| head 500 | stats count dc(Service_Name) as services by Account_Name Client_Address | where services > 2')
+
+TASKS = {"tasks": [
+    {"id": 1, "description": "Write a Splunk SPL query to find Kerberos service ticket requests (EventCode 4769)",
+     "depends_on": [], "agent": "spl_writer_agent"},
+    {"id": 2, "description": "Edit existing SPL to filter for RC4 encrypted tickets (0x17) to non-krbtgt services",
+     "depends_on": [1], "agent": "spl_filter_agent"},
+    {"id": 3, "description": "Apply a statistical analysis counting distinct services per account and client",
+     "depends_on": [1], "agent": "spl_statistical_analysis_agent"},
+    {"id": 4, "description": "Edit existing SPL to combine the filter and the statistics with the right index and field names",
+     "depends_on": [2, 3], "agent": "spl_refactor_agent"},
+    {"id": 5, "description": "Run a splunk SPL search to find accounts requesting many RC4 service tickets",
+     "depends_on": [4], "agent": "splunk_executor_agent"},
+]}
+
+RESEARCH_DOCUMENT = """## Detection procedure
+Kerberoasting requests service tickets (EventCode 4769) with RC4 encryption (Ticket_Encryption_Type 0x17)
+for many Service_Name values from one Account_Name. Related events: 4768 (TGT requests), 4624 (logons).
+Fields: Account_Name, Service_Name, Ticket_Encryption_Type, Client_Address, Ticket_Options, Failure_Code."""
+
+
+def _with_context(tasks: dict) -> dict:
+    return {"tasks": [{**task, "isolated_context": f"EventCode 4769 fields: Account_Name, Service_Name, "
+                                                   f"Ticket_Encryption_Type, Client_Address (task {task['id']})"}
+                      for task in tasks["tasks"]]}
+
+
+# (phrase in the prompt, answer); the first match wins, so more specific phrases come first
+RESPONSES = [
+    ("planning research on windows attacks", json.dumps({"queries": RESEARCH_QUERIES})),
+    ("produce facts based detection procedures", RESEARCH_DOCUMENT),
+    ("relevant Event ID to be incorporated", "[4769, 4768]"),
+    ("creating a detailed JSON checklist", json.dumps(TASKS)),
+    ("adding ALL the necessary details to each task", json.dumps(TASKS)),
+    ("adding ALL the necessary context", json.dumps(_with_context(TASKS))),
+    ("does not return any results due to", FINAL_SPL),
+    ("drafts must now be combined into one query", MERGED_SPL),
+    ("The query you created was the following", "Three accounts requested RC4 tickets for more than two services; "
+                                                "user017 from 10.0.3.44 is the strongest Kerberoasting candidate."),
+    ("Write a summary of the following text", RESEARCH_DOCUMENT),
+    ("Write the Splunk SPL Query but include", WRITER_SPL),
+    ("Apply a statistical analysis", STATS_SPL),
+    ("Update the provided Splunk SPL Query", FILTER_SPL),
+]
+
+
+def answer(prompt: str) -> str:
+    for phrase, response in RESPONSES:
+        if phrase in prompt:
+            return response
+    return "OK"
+
+
+def fake_embedding(item) -> list:
+    seed = hashlib.sha256(json.dumps(item).encode("utf-8")).digest()
+    rng = random.Random(seed)
+    vector = [rng.gauss(0.0, 1.0) for _ in range(EMBEDDING_DIMENSIONS)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _tokens(text: str) -> int:
+    # close enough for usage accounting; the real tokenizer is not needed here
+    return max(1, len(text) // 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?", 1)[0].rstrip("/")
+        server = self.server
+        if path.endswith("/chat/completions"):
+            server.count("chat")
+            time.sleep(server.latency)
+            prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+            content = answer(prompt)
+            prompt_tokens, completion_tokens = _tokens(prompt), _tokens(content)
+            server.count("prompt_tokens", prompt_tokens)
+            server.count("completion_tokens", completion_tokens)
+            return self._send(200, {
+                "id": f"chatcmpl-{server.counts['chat']}", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "gpt-3.5-turbo"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+        if path.endswith("/embeddings"):
+            inputs = body.get("input", [])
+            inputs = inputs if isinstance(inputs, list) and inputs and isinstance(inputs[0], (list, str)) else [inputs]
+            server.count("embeddings")
+            server.count("embedded_inputs", len(inputs))
+            return self._send(200, {
+                "object": "list", "model": body.get("model", "text-embedding-ada-002"),
+                "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(item)} for i, item in enumerate(inputs)],
+                "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+            })
+        server.count("not_found")
+        return self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    """
+    Parameters:
+    - latency (float): Seconds each chat completion takes.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.05, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    @property
+    def api_base(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    def count(self, route: str, amount: int = 1):
+        with self.lock:
+            self.counts[route] += amount
+
+    def start(self) -> "FakeOpenAI":
+        threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True).start()
+        return self
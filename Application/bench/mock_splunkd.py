@@ -0,0 +1,272 @@
+'''
+Local stand-in for splunkd's REST API, serving synthetic Windows Security events.
+
+Implements what SplunkGPT calls through splunklib: auth/login, server/info, search jobs
+(create, status, results, control) on both the v1 and v2 paths, oneshot searches, and
+the export endpoint. Searches are "evaluated" just far enough for the
+pipeline: tstats inventories, fieldsummary, `stats dc(*) by EventCode`, and EventCode
+filters with an optional `| head N`. Every request is counted per route.
+'''
+# Standard Libraries
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+SPLUNK_VERSION = "9.1.0"
+SESSION_KEY = "bench-session-key"
+
+HOSTS = [f"WS{n:03d}" for n in range(40)] + ["DC01", "DC02", "FS01"]
+USERS = [f"user{n:03d}" for n in range(120)] + ["svc_sql", "svc_backup", "administrator"]
+SERVICES = ["MSSQLSvc/sql01.corp.local:1433", "HTTP/web01.corp.local", "cifs/fs01.corp.local", "krbtgt"]
+PROCESSES = [r"C:\Windows\System32\cmd.exe", r"C:\Windows\System32\WindowsPowerShell\v1.0\powershell.exe",
+             r"C:\Windows\System32\rundll32.exe", r"C:\Program Files\Office\WINWORD.EXE"]
+
+# EventCode -> generator of its code-specific fields
+EVENT_FIELDS = {
+    "4624": lambda r: {"Account_Name": r.choice(USERS), "Logon_Type": r.choice(["2", "3", "10"]),
+                       "Source_Network_Address": f"10.0.{r.randint(0, 9)}.{r.randint(1, 254)}",
+                       "Logon_Process": r.choice(["NtLmSsp", "Kerberos", "User32"]),
+                       "Authentication_Package": r.choice(["NTLM", "Kerberos", "Negotiate"])},
+    "4625": lambda r: {"Account_Name": r.choice(USERS), "Logon_Type": r.choice(["3", "10"]),
+                       "Failure_Reason": "Unknown user name or bad password.",
+                       "Status": "0xC000006D", "Sub_Status": r.choice(["0xC000006A", "0xC0000064"]),
+                       "Source_Network_Address": f"10.0.{r.randint(0, 9)}.{r.randint(1, 254)}"},
+    "4688": lambda r: {"Account_Name": r.choice(USERS), "New_Process_Name": r.choice(PROCESSES),
+                       "Creator_Process_Name": r.choice(PROCESSES),
+                       "Process_Command_Line": f"{r.choice(PROCESSES)} /c whoami {r.randint(0, 99)}",
+                       "Token_Elevation_Type": r.choice(["%%1936", "%%1937", "%%1938"])},
+    "4768": lambda r: {"Account_Name": r.choice(USERS), "Service_Name": "krbtgt",
+                       "Client_Address": f"::ffff:10.0.{r.randint(0, 9)}.{r.randint(1, 254)}",
+                       "Ticket_Encryption_Type": r.choice(["0x12", "0x17"]), "Result_Code": "0x0"},
+    "4769": lambda r: {"Account_Name": r.choice(USERS), "Service_Name": r.choice(SERVICES),
+                       "Client_Address": f"::ffff:10.0.{r.randint(0, 9)}.{r.randint(1, 254)}",
+                       "Ticket_Encryption_Type": r.choice(["0x12", "0x12", "0x17"]),
+                       "Ticket_Options": r.choice(["0x40810000", "0x40800000"]), "Failure_Code": "0x0"},
+    "4672": lambda r: {"Account_Name": r.choice(USERS), "Privileges": "SeDebugPrivilege SeBackupPrivilege"},
+}
+
+
+def synthetic_events(count: int = 20000, seed: int = 7, span: float = 7 * 24 * 3600) -> list:
+    """Deterministic WinEventLog:Security events (plus a few Sysmon events for the inventory)."""
+    rng = random.Random(seed)
+    now = time.time()
+    codes = list(EVENT_FIELDS)
+    events = []
+    for n in range(count):
+        sysmon = n % 25 == 0
+        code = "1" if sysmon else rng.choice(codes)
+        host = rng.choice(HOSTS)
+        event = {
+            "_time": now - rng.random() * span,
+            "index": "main",
+            "sourcetype": "XmlWinEventLog:Microsoft-Windows-Sysmon/Operational" if sysmon else "WinEventLog:Security",
+            "source": "XmlWinEventLog:Microsoft-Windows-Sysmon/Operational" if sysmon else "WinEventLog:Security",
+            "host": host,
+            "ComputerName": f"{host}.corp.local",
+            "EventCode": code,
+            "RecordNumber": str(100000 + n),
+            "Keywords": rng.choice(["Audit Success", "Audit Failure"]),
+        }
+        if not sysmon:
+            event.update(EVENT_FIELDS[code](rng))
+        event["_raw"] = " ".join(f"{k}={v}" for k, v in event.items() if not k.startswith("_"))
+        events.append(event)
+    events.sort(key=lambda event: event["_time"], reverse=True)
+    return events
+
+
+def _codes(search: str) -> list:
+    match = re.search(r"EventCode\s+IN\s*\(([^)]*)\)", search, re.IGNORECASE)
+    if match:
+        return [code.strip().strip('"') for code in match.group(1).split(",") if code.strip()]
+    return re.findall(r"EventCode\s*=\s*\"?(\d+)", search)
+
+
+def evaluate(events: list, search: str) -> list:
+    """Result rows for the handful of search shapes SplunkGPT issues."""
+    if "tstats" in search:
+        groups = {}
+        for event in events:
+            key = (event["index"], event["sourcetype"], event["source"])
+            group = groups.setdefault(key, {"index": key[0], "sourcetype": key[1], "source": key[2],
+                                            "count": 0, "firstTime": event["_time"], "lastTime": event["_time"]})
+            group["count"] += 1
+            group["firstTime"] = min(group["firstTime"], event["_time"])
+            group["lastTime"] = max(group["lastTime"], event["_time"])
+        return [{k: str(v) for k, v in group.items()} for group in groups.values()]
+    codes = set(_codes(search))
+    matching = [event for event in events if not codes or event["EventCode"] in codes]
+    if "fieldsummary" in search:
+        fields = {}
+        for event in matching:
+            for field, value in event.items():
+                if not field.startswith("_"):
+                    fields.setdefault(field, []).append(value)
+        return [{"field": field, "count": str(len(values)), "distinct_count": str(len(set(values))),
+                 "numeric_count": str(sum(str(v).isdigit() for v in values))} for field, values in fields.items()]
+    if re.search(r"stats\s+dc\(\*\)", search):
+        rows = []
+        for code in sorted(codes):
+            values = {}
+            for event in matching:
+                if event["EventCode"] == code:
+                    for field, value in event.items():
+                        if not field.startswith("_") and field != "EventCode":
+                            values.setdefault(field, set()).add(value)
+            if values:
+                rows.append({"EventCode": code, **{field: str(len(v)) for field, v in values.items()}})
+        return rows
+    head = re.search(r"\|\s*head\s+(\d+)", search)
+    rows = matching[:int(head.group(1))] if head else matching
+    return [{**event, "_time": time.strftime("%Y-%m-%dT%H:%M:%S.000+00:00", time.gmtime(event["_time"]))} for event in rows]
+
+
+# Job entries carry an ACL like real splunkd; splunklib's Job.results() and cancel() read it for the namespace
+JOB_ACL = {"owner": "admin", "app": "search", "sharing": "global"}
+
+
+def atom_keys(content: dict) -> str:
+    """<s:key> elements for content; dict values become nested <s:dict>s."""
+    return "".join(f'<s:key name="{escape(k)}">' + (f"<s:dict>{atom_keys(v)}</s:dict>" if isinstance(v, dict) else escape(str(v)))
+                   + "</s:key>" for k, v in content.items())
+
+
+def atom_entry(name: str, content: dict, root: bool = True) -> str:
+    keys = atom_keys(content)
+    entry = (f'<entry xmlns="http://www.w3.org/2005/Atom" xmlns:s="http://dev.splunk.com/ns/rest">'
+             f'<title>{escape(name)}</title><id>https://localhost/services/{escape(name)}</id>'
+             f'<updated>2024-01-01T00:00:00+00:00</updated><link href="/services/{escape(name)}" rel="alternate"/>'
+             f'<author><name>admin</name></author><content type="text/xml"><s:dict>{keys}</s:dict></content></entry>')
+    if root:
+        return '<?xml version="1.0" encoding="UTF-8"?>' + entry
+    return ('<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom" '
+            'xmlns:s="http://dev.splunk.com/ns/rest"><title>feed</title>' + entry + '</feed>')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self) -> dict:
+        parts = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            params.update({k: v[-1] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()})
+        return params
+
+    def _send(self, status: int, body, content_type: str = "application/json"):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if self.close_connection:
+            # splunklib asks for "Connection: Close" and drops a response not marked as closing before reading it
+            self.send_header("Connection", "Close")
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.count("bytes_out", len(data))
+
+    def do_GET(self):
+        self._route()
+
+    def do_POST(self):
+        self._route()
+
+    def do_DELETE(self):
+        self._route()
+
+    def _route(self):
+        server = self.server
+        path = urlsplit(self.path).path.rstrip("/")
+        params = self._params()
+        if path.endswith("/auth/login"):
+            server.count("auth/login")
+            return self._send(200, f"<response><sessionKey>{SESSION_KEY}</sessionKey></response>", "text/xml")
+        if self.headers.get("Authorization") != f"Splunk {SESSION_KEY}":
+            server.count("unauthorized")
+            return self._send(401, "<response><messages><msg type=\"WARN\">call not properly authenticated</msg></messages></response>", "text/xml")
+        if path.endswith("/server/info"):
+            server.count("server/info")
+            return self._send(200, atom_entry("server-info", {"version": SPLUNK_VERSION, "instance_type": "splunk"}, root=False), "text/xml")
+        match = re.search(r"/search/(?:v2/)?jobs(?:/([^/]+))?(?:/([^/]+))?$", path)
+        if not match:
+            server.count("not_found")
+            return self._send(404, "{}")
+        sid, action = match.groups()
+        if sid == "export":
+            server.count("jobs/export")
+            time.sleep(server.latency)
+            rows = evaluate(server.events, params.get("search", ""))
+            lines = [json.dumps({"preview": False, "offset": i, "result": row}) for i, row in enumerate(rows)]
+            return self._send(200, "\n".join(lines) + "\n")
+        if sid is None:
+            search = params.get("search", "")
+            if params.get("exec_mode") == "oneshot":
+                server.count("jobs/oneshot")
+                time.sleep(server.latency)
+                return self._send(200, json.dumps({"preview": False, "results": evaluate(server.events, search)}))
+            server.count("jobs/create")
+            new_sid = uuid.uuid4().hex
+            with server.lock:
+                server.jobs[new_sid] = {"search": search, "created": time.time()}
+            if params.get("exec_mode") == "blocking":
+                time.sleep(server.latency)
+            return self._send(201, f"<response><sid>{new_sid}</sid></response>", "text/xml")
+        job = server.jobs.get(sid)
+        if job is None:
+            server.count("not_found")
+            return self._send(404, "<response><messages><msg type=\"FATAL\">Unknown sid.</msg></messages></response>", "text/xml")
+        if action == "control":
+            server.count("jobs/control")
+            with server.lock:
+                server.jobs.pop(sid, None)
+            return self._send(200, "<response><messages><msg type=\"INFO\">Search job cancelled.</msg></messages></response>", "text/xml")
+        elapsed = time.time() - job["created"]
+        done = elapsed >= server.latency
+        if action == "results":
+            server.count("jobs/results")
+            return self._send(200, json.dumps({"preview": False, "results": evaluate(server.events, job["search"])}))
+        server.count("jobs/status")
+        rows = evaluate(server.events, job["search"]) if done else []
+        return self._send(200, atom_entry(f"search/jobs/{sid}", {
+            "sid": sid, "dispatchState": "DONE" if done else "RUNNING", "isDone": "1" if done else "0",
+            "isFailed": "0", "doneProgress": "1.0" if done else f"{min(elapsed / max(server.latency, 1e-6), 0.99):.2f}",
+            "scanCount": str(len(server.events)) if done else "0", "eventCount": str(len(rows)),
+            "resultCount": str(len(rows)), "runDuration": f"{min(elapsed, server.latency):.3f}",
+            "eai:acl": JOB_ACL,
+        }), "text/xml")
+
+
+class MockSplunkd(ThreadingHTTPServer):
+    """
+    Parameters:
+    - events (list): Events searches run over (see synthetic_events).
+    - latency (float): Seconds each search takes (oneshot/export sleep; jobs stay RUNNING this long).
+    """
+    daemon_threads = True
+
+    def __init__(self, events: list, latency: float = 0.1, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.events = events
+        self.latency = latency
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    def count(self, route: str, amount: int = 1):
+        with self.lock:
+            self.counts[route] += amount
+
+    def start(self) -> "MockSplunkd":
+        threading.Thread(target=self.serve_forever, name="mock-splunkd", daemon=True).start()
+        return self
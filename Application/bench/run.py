@@ -0,0 +1,326 @@
+'''
+End-to-end benchmark of the SplunkGPT pipeline against local stand-ins.
+
+Usage (from the Application directory):
+    python bench/run.py [--objectives N] [--repeat N] [--events N]
+                        [--llm-latency S] [--splunk-latency S]
+                        [--baseline bench/baseline.json] [--save-baseline] [--report report.json]
+                        [--startup-only] [--startup-samples N]
+
+The run needs no credentials and, apart from tiktoken, no network access:
+- a mock splunkd (bench/mock_splunkd.py) serves synthetic Windows Security events;
+- a deterministic fake chat model and embeddings (bench/fake_openai.py) sit behind an
+  OpenAI-compatible endpoint;
+- serper search and browserless scrape responses are canned recordings loaded into an
+  offline http_cache.
+tiktoken downloads its cl100k_base encoding on first use and caches it (see
+TIKTOKEN_CACHE_DIR). On a machine without network access, copy a populated cache there
+first; the run stops with exit status 2 if the encoding cannot be loaded.
+
+Every cache, store and index is written to a temporary directory. Each repetition sends
+every objective through pipeline.run_objective, the code batch.py runs, executor tasks
+included. Per stage it reports the wall time from run_objective and the chain calls,
+Splunk searches and web requests from the objective's trace. The "total" row covers the
+whole objective: wall time, the tracemalloc peak and request counts seen by the stand-ins
+(LLM calls, embedding calls, Splunk REST calls and bytes, web cache hits). The first
+repetition is reported as "cold" and the median of the rest as "warm". Startup is timed
+separately as the median wall time of `import pipeline` in fresh interpreters.
+
+Against the baseline (bench/baseline.json, recorded with the default options), the run
+fails with exit status 1 if startup or a stage is slower than --tolerance, if peak memory
+grew more than --memory-tolerance, or if it made more requests than before. Without a
+baseline it fails with exit status 2 unless --save-baseline is given.
+'''
+# Standard Libraries
+import argparse
+import base64
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, APP_DIR)
+
+from fake_openai import RESEARCH_QUERIES, FakeOpenAI
+from mock_splunkd import MockSplunkd, synthetic_events
+
+OBJECTIVES = ["Kerberoasting", "Password spraying", "Pass the hash", "Golden ticket", "AS-REP roasting",
+              "DCSync", "Suspicious PowerShell execution", "Brute force logons"]
+# Per-stage counts taken from the trace breakdown (chain calls include LLM cache hits)
+TRACE_COUNTS = {"chain_calls": "llm_calls", "splunk_searches": "searches", "web_requests": "web_requests"}
+# Counts that must not grow against the baseline
+REQUEST_COUNTS = ("llm_calls", "chain_calls", "embedding_calls", "splunk_requests", "splunk_searches", "web_requests")
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+# What app.py and batch.py pay before they can do anything
+STARTUP_SNIPPET = "import time; start = time.perf_counter(); import pipeline; print(time.perf_counter() - start)"
+# Differences below these are noise, whatever the relative tolerance says
+MIN_SECONDS_DELTA = 0.05
+MIN_MEMORY_DELTA_KB = 512
+
+
+def page_url(query_index: int, rank: int) -> str:
+    return f"https://intel.example.com/q{query_index}/article-{rank}.html"
+
+
+def page_html(url: str) -> str:
+    return (f"<html><head><title>{url}</title><script>var x = 1;</script></head><body>"
+            "<h1>Detecting Kerberoasting with Windows Security logs</h1>"
+            "<p>Watch EventCode 4769 with Ticket_Encryption_Type 0x17 (RC4) for many Service_Name values "
+            "requested by one Account_Name. Correlate with 4768 and 4624 logons from the same Client_Address.</p>"
+            + "<p>Background paragraph on Active Directory service accounts and SPNs.</p>" * 20 + "</body></html>")
+
+
+def write_recordings(path: str) -> int:
+    """Canned serper and browserless responses for the queries the fake planner returns."""
+    from http_cache import HTTPCache, normalize_text, normalize_url
+    records = []
+    for i, query in enumerate(RESEARCH_QUERIES):
+        organic = [{"title": f"Article {rank} for {query}", "link": page_url(i, rank),
+                    "snippet": "EventCode 4769 Ticket_Encryption_Type 0x17 Service_Name Account_Name"} for rank in range(3)]
+        records.append((f"serper:{normalize_text(query)}", json.dumps({"organic": organic}), "application/json"))
+        for rank in range(3):
+            url = page_url(i, rank)
+            records.append((f"page:{normalize_url(url)}", page_html(url), "text/html"))
+    with open(path, "w") as file:
+        for cache_key, body, content_type in records:
+            file.write(json.dumps({"key": HTTPCache._hash(cache_key), "status": 200,
+                                   "headers": {"Content-Type": content_type},
+                                   "body": base64.b64encode(body.encode("utf-8")).decode("ascii"),
+                                   "etag": None, "last_modified": None}) + "\n")
+    return len(records)
+
+
+def configure_environment(workdir: str, openai_server: FakeOpenAI, splunkd: MockSplunkd):
+    """Point every client, cache and store at the stand-ins and the scratch directory (before helpers is imported)."""
+    os.environ.update({
+        "OPENAI_API_KEY": "bench", "OPENAI_API_BASE": openai_server.api_base, "OPENAI_BASE_URL": openai_server.api_base,
+        "SERP_API_KEY": "bench", "BROWSERLESS_API_KEY": "bench",
+        "SPLUNK_URL": splunkd.server_address[0], "SPLUNK_PORT": str(splunkd.server_address[1]),
+        "SPLUNK_SCHEME": "http", "SPLUNK_USERNAME": "admin", "SPLUNK_PASSWORD": "bench",
+        "SPLUNK_POLL_INITIAL": "0.05",
+        "HTTP_CACHE_OFFLINE": "true",
+        "HTTP_CACHE_PATH": os.path.join(workdir, "http_cache.db"),
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.db"),
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embedding_cache"),
+        "VECTOR_STORE_DIR": os.path.join(workdir, "vector_store"),
+        "FIELD_CATALOG_PATH": os.path.join(workdir, "field_catalog.db"),
+        "INVENTORY_PATH": os.path.join(workdir, "splunk_inventory.json"),
+        "STATE_STORE_PATH": os.path.join(workdir, "state_store.db"),
+        "TASK_STORE_PATH": os.path.join(workdir, "task_store.db"),
+        "TRACE_DIR": os.path.join(workdir, "traces"),
+    })
+
+
+class Meter:
+    """Measures one stage: wall time, tracemalloc peak and request-counter deltas."""
+
+    def __init__(self, openai_server, splunkd, http_cache, trace_memory=True):
+        self.openai_server = openai_server
+        self.splunkd = splunkd
+        self.http_cache = http_cache
+        self.trace_memory = trace_memory
+
+    def counters(self) -> dict:
+        splunk = self.splunkd.counts
+        return {
+            "llm_calls": self.openai_server.counts["chat"],
+            "embedding_calls": self.openai_server.counts["embeddings"],
+            "splunk_requests": sum(v for k, v in splunk.items() if k != "bytes_out"),
+            "splunk_bytes": splunk["bytes_out"],
+            "web_cache_hits": self.http_cache.hits,
+        }
+
+    def measure(self, func, *args, **kwargs):
+        before = self.counters()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak_kb = (tracemalloc.get_traced_memory()[1] - current) / 1024 if self.trace_memory else 0.0
+        after = self.counters()
+        return result, {"seconds": seconds, "peak_kb": peak_kb, **{k: after[k] - before[k] for k in after}}
+
+
+def load_tokenizer() -> bool:
+    """Load tiktoken's encoding before anything starts, so a missing cache fails here and not mid-run."""
+    from tokens import encoding_for
+    try:
+        encoding_for()
+    except Exception as e:
+        print(f"ERROR: tiktoken could not load cl100k_base ({type(e).__name__}). It is downloaded on first use; "
+              f"without network access, point TIKTOKEN_CACHE_DIR at a cache that already holds it.", file=sys.stderr)
+        return False
+    return True
+
+
+def measure_startup(samples: int) -> dict:
+    """Median wall time of `import pipeline` in fresh interpreters, with the environment configured above."""
+    times = []
+    for _ in range(samples):
+        output = subprocess.run([sys.executable, "-c", STARTUP_SNIPPET], cwd=APP_DIR, env=os.environ.copy(),
+                                check=True, capture_output=True, text=True).stdout
+        times.append(float(output.split()[-1]))
+    return {"seconds": statistics.median(times), "samples": times}
+
+
+def run_objective(pipeline, instrumentation, meter, user_input, run_id) -> dict:
+    """One objective through pipeline.run_objective; returns {stage: measurement} plus a "total" row."""
+    # run_id must be new: reopening a trace picks up the totals already recorded in it
+    with instrumentation.run(run_id) as trace:
+        result, total = meter.measure(pipeline.run_objective, user_input)
+    breakdown = {row["stage"]: row for row in trace.breakdown()}
+    stages = {}
+    for stage, seconds in result["timings"].items():
+        row = breakdown.get(stage, {})
+        stages[stage] = {"seconds": seconds, **{key: row.get(column, 0) for key, column in TRACE_COUNTS.items()}}
+    stages["total"] = total
+    return stages
+
+
+def combine(runs: list) -> dict:
+    """Sum each stage over the objectives of one repetition (peak memory: the largest)."""
+    totals = {}
+    for stages in runs:
+        for stage, values in stages.items():
+            total = totals.setdefault(stage, {})
+            for key, value in values.items():
+                total[key] = max(total.get(key, 0), value) if key == "peak_kb" else total.get(key, 0) + value
+    return totals
+
+
+def median_of(repetitions: list) -> dict:
+    return {stage: {key: statistics.median(rep[stage][key] for rep in repetitions) for key in repetitions[0][stage]}
+            for stage in repetitions[0]}
+
+
+def compare(report: dict, baseline: dict, tolerance: float, memory_tolerance: float) -> list:
+    failures = []
+    startup, base_startup = report["startup"]["seconds"], baseline.get("startup", {}).get("seconds")
+    if base_startup and startup > base_startup * (1 + tolerance) and startup - base_startup > MIN_SECONDS_DELTA:
+        failures.append(f"startup: {startup:.3f}s vs baseline {base_startup:.3f}s")
+    for phase, stages in report["phases"].items():
+        for stage, values in stages.items():
+            base = baseline.get("phases", {}).get(phase, {}).get(stage)
+            if not base:
+                continue
+            if values["seconds"] > base["seconds"] * (1 + tolerance) and values["seconds"] - base["seconds"] > MIN_SECONDS_DELTA:
+                failures.append(f"{phase}/{stage}: {values['seconds']:.3f}s vs baseline {base['seconds']:.3f}s")
+            if "peak_kb" in values and "peak_kb" in base and values["peak_kb"] > base["peak_kb"] * (1 + memory_tolerance) \
+                    and values["peak_kb"] - base["peak_kb"] > MIN_MEMORY_DELTA_KB:
+                failures.append(f"{phase}/{stage}: peak {values['peak_kb']:.0f}KB vs baseline {base['peak_kb']:.0f}KB")
+            for key in REQUEST_COUNTS:
+                if key in values and values[key] > base.get(key, values[key]):
+                    failures.append(f"{phase}/{stage}: {values[key]:.0f} {key} vs baseline {base[key]:.0f}")
+    return failures
+
+
+def print_report(report: dict):
+    columns = ["seconds", "peak_kb", "llm_calls", "chain_calls", "embedding_calls", "splunk_requests", "splunk_searches",
+               "splunk_bytes", "web_requests", "web_cache_hits"]
+    print(f"{'phase/stage':<24}" + "".join(f"{c:>16}" for c in columns))
+    for phase, stages in report["phases"].items():
+        for stage, values in stages.items():
+            cells = "".join(f"{'-':>16}" if c not in values else f"{values[c]:>16.3f}" if c == "seconds" else f"{values[c]:>16.0f}"
+                            for c in columns)
+            print(f"{phase + '/' + stage:<24}{cells}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SplunkGPT pipeline against local mock services.")
+    parser.add_argument("--objectives", type=int, default=3, help="Objectives per repetition")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions (the first one runs with cold caches)")
+    parser.add_argument("--events", type=int, default=20000, help="Synthetic events served by the mock splunkd")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake chat completion")
+    parser.add_argument("--splunk-latency", type=float, default=0.1, help="Seconds per mock Splunk search")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline report to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown per stage")
+    parser.add_argument("--memory-tolerance", type=float, default=0.5, help="Allowed relative growth of peak memory")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Skip memory tracing (it slows Python down)")
+    parser.add_argument("--report", default=None, help="Also write the report as JSON to this path")
+    parser.add_argument("--startup-samples", type=int, default=5, help="Fresh interpreters timed for startup")
+    parser.add_argument("--startup-only", action="store_true", help="Only measure startup")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    args = parser.parse_args(argv)
+    if not load_tokenizer():
+        return 2
+
+    workdir = tempfile.mkdtemp(prefix="splunkgpt-bench-")
+    splunkd = MockSplunkd(synthetic_events(args.events), latency=args.splunk_latency).start()
+    openai_server = FakeOpenAI(latency=args.llm_latency).start()
+    configure_environment(workdir, openai_server, splunkd)
+    # LOCAL_CORPUS and the other relative paths in helpers resolve against the Application directory
+    os.chdir(APP_DIR)
+    trace_memory = not args.no_tracemalloc
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        from http_cache import HTTPCache
+        recordings = os.path.join(workdir, "recordings.jsonl")
+        write_recordings(recordings)
+        HTTPCache(os.environ["HTTP_CACHE_PATH"]).load(recordings)
+
+        startup = measure_startup(max(args.startup_samples, 1))
+        phases = {}
+        if not args.startup_only:
+            import instrumentation
+            import pipeline
+            from helpers import get_http_cache
+
+            meter = Meter(openai_server, splunkd, get_http_cache(), trace_memory=trace_memory)
+            objectives = [OBJECTIVES[i % len(OBJECTIVES)] for i in range(args.objectives)]
+            repetitions = []
+            for repetition in range(max(args.repeat, 1)):
+                repetitions.append(combine([run_objective(pipeline, instrumentation, meter, objective, f"bench-{repetition}-{i}")
+                                            for i, objective in enumerate(objectives)]))
+                print(f"repetition {repetition + 1}/{args.repeat} done")
+
+            phases["cold"] = repetitions[0]
+            if len(repetitions) > 1:
+                phases["warm"] = median_of(repetitions[1:])
+        report = {
+            "config": {k: getattr(args, k) for k in ("objectives", "repeat", "events", "llm_latency", "splunk_latency")},
+            "startup": startup,
+            "phases": phases,
+        }
+    finally:
+        splunkd.shutdown()
+        openai_server.shutdown()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"startup (import pipeline in a fresh interpreter): {startup['seconds']:.3f}s median")
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as file:
+            json.dump(report, file, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=1)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"ERROR: no baseline at {args.baseline}; record one with --save-baseline", file=sys.stderr)
+        return 2
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline.get("config") != report["config"]:
+        print("Warning: baseline was recorded with a different configuration")
+    failures = compare(report, baseline, args.tolerance, args.memory_tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# Standard Libraries
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+# Imports related to LangChain
+from langchain.embeddings.base import Embeddings
+
+from instrumentation import span
+
+#
+# Content-addressed embedding cache
+#
+'''
+Vectors are stored as raw float32 rows in <model>.f32 and located through a SQLite
+index keyed by sha256(model name + chunk text). Once the array file reaches
+EMBEDDING_CACHE_MAX_BYTES the least recently used rows are overwritten in place,
+so the file never grows past the limit. A limit smaller than one row (e.g.
+EMBEDDING_CACHE_MAX_BYTES=0) turns caching off: every text goes to the base embeddings.
+'''
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(os.getcwd(), "embedding_cache"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def chunk_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a LangChain Embeddings object and only forwards texts that are not cached yet.
+
+    Parameters:
+    - base: The embeddings implementation to call on a miss (e.g. OpenAIEmbeddings).
+    - cache_dir (str): Directory holding the array file and its index.
+    - max_bytes (int): Size limit of the array file.
+    """
+
+    def __init__(self, base: Embeddings, cache_dir: str = EMBEDDING_CACHE_DIR, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.base = base
+        self.model = getattr(base, "model", base.__class__.__name__)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", self.model)
+        self.array_path = os.path.join(cache_dir, f"{slug}.f32")
+        self.db = sqlite3.connect(os.path.join(cache_dir, f"{slug}.index"), check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS vectors (
+                key TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS vectors_lru ON vectors(last_used);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        row = self.db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim = row[0] if row else None
+        if not os.path.exists(self.array_path):
+            open(self.array_path, 'wb').close()
+
+    #
+    # Storage
+    #
+    def _row_bytes(self) -> int:
+        return self.dim * 4
+
+    def _read_rows(self, rows: List[int]) -> np.ndarray:
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        with open(self.array_path, 'rb') as file:
+            for i, row in enumerate(rows):
+                file.seek(row * self._row_bytes())
+                out[i] = np.frombuffer(file.read(self._row_bytes()), dtype=np.float32)
+        return out
+
+    def _allocate_row(self) -> Optional[int]:
+        """
+        Next free row: append while under the size limit, otherwise evict the least recently
+        used entry. None when the limit cannot hold a single row.
+        """
+        # rows are only freed by eviction, which reuses them immediately, so 0..used-1 is always dense
+        used = self.db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        if (used + 1) * self._row_bytes() <= self.max_bytes:
+            return used
+        oldest = self.db.execute("SELECT key, row FROM vectors ORDER BY last_used LIMIT 1").fetchone()
+        if oldest is None:
+            return None
+        key, row = oldest
+        self.db.execute("DELETE FROM vectors WHERE key = ?", (key,))
+        return row
+
+    def _store(self, keys: List[str], vectors: np.ndarray):
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            self.db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (self.dim,))
+        now = time.time()
+        with span("file", "embedding_cache", rows=len(keys), bytes=len(keys) * self._row_bytes()):
+            with open(self.array_path, 'r+b') as file:
+                for key, vector in zip(keys, vectors):
+                    if self.db.execute("SELECT 1 FROM vectors WHERE key = ?", (key,)).fetchone():
+                        continue
+                    row = self._allocate_row()
+                    if row is None:
+                        break
+                    file.seek(row * self._row_bytes())
+                    file.write(np.asarray(vector, dtype=np.float32).tobytes())
+                    self.db.execute("INSERT INTO vectors (key, row, last_used) VALUES (?, ?, ?)", (key, row, now))
+            self.db.commit()
+
+    #
+    # Embeddings interface
+    #
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        keys = [chunk_key(self.model, text) for text in texts]
+        result = [None] * len(texts)
+        with self._lock:
+            found = {}
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self.db.execute(f"SELECT key, row FROM vectors WHERE key IN ({placeholders})", batch))
+            if found:
+                hit_keys = list(found)
+                for key, vector in zip(hit_keys, self._read_rows([found[k] for k in hit_keys])):
+                    found[key] = vector.tolist()
+                self.db.executemany("UPDATE vectors SET last_used = ? WHERE key = ?",
+                                    [(time.time(), key) for key in hit_keys])
+                self.db.commit()
+        missing = []
+        for i, key in enumerate(keys):
+            if key in found:
+                result[i] = found[key]
+            else:
+                missing.append(i)
+        # identical chunks inside one batch are only embedded once
+        unique_missing = list({keys[i]: i for i in missing}.values())
+        self.hits += len(texts) - len(missing)
+        self.misses += len(unique_missing)
+        if unique_missing:
+            vectors = self.base.embed_documents([texts[i] for i in unique_missing])
+            fresh = {keys[i]: vector for i, vector in zip(unique_missing, vectors)}
+            with self._lock:
+                self._store(list(fresh), np.asarray(vectors, dtype=np.float32))
+            for i in missing:
+                result[i] = fresh[keys[i]]
+        return result
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,179 @@
+'''
+Persistent catalog of Splunk field schemas keyed by index, sourcetype and EventCode.
+
+Field layouts change rarely, so gather_schema_info asks the catalog first and only
+runs schema discovery against Splunk for codes it has never seen. Entries older than
+FIELD_CATALOG_TTL are still served, and a background thread refreshes them. Codes with
+no events are cached too, as empty entries, for the shorter FIELD_CATALOG_NEGATIVE_TTL;
+after that they are looked up again before the objective continues.
+
+Usage:
+    python field_catalog.py list
+    python field_catalog.py invalidate [--index main] [--sourcetype WinEventLog] [--code 4688]
+'''
+# Standard Libraries
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from instrumentation import span
+
+FIELD_CATALOG_PATH = os.getenv("FIELD_CATALOG_PATH", os.path.join(os.getcwd(), "field_catalog.db"))
+FIELD_CATALOG_TTL = float(os.getenv("FIELD_CATALOG_TTL", str(7 * 24 * 3600)))
+FIELD_CATALOG_NEGATIVE_TTL = float(os.getenv("FIELD_CATALOG_NEGATIVE_TTL", str(3600)))
+ANY_SOURCETYPE = "*"
+
+
+class FieldCatalog:
+    """
+    TTL cache of {field_name: {"distinct_count", "type"}} per (index, sourcetype, EventCode).
+
+    Parameters:
+    - fetcher: Callable(event_codes, index=..., sourcetype=..., on_progress=...) returning
+      {event_code: fields}; used for misses and background refreshes. May be None for read/invalidate-only use.
+    - path (str): SQLite file holding the catalog.
+    - ttl (float): Seconds before an entry is considered stale.
+    - negative_ttl (float): Seconds an empty entry (a code with no fields) is served before it is fetched again.
+    """
+
+    def __init__(self, fetcher: Optional[Callable] = None, path: str = FIELD_CATALOG_PATH, ttl: float = FIELD_CATALOG_TTL,
+                 negative_ttl: float = FIELD_CATALOG_NEGATIVE_TTL):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS field_catalog (
+                idx TEXT NOT NULL,
+                sourcetype TEXT NOT NULL,
+                event_code TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (idx, sourcetype, event_code)
+            )
+        """)
+        self.db.commit()
+
+    def _lookup(self, index, sourcetype, event_code):
+        with self._lock:
+            row = self.db.execute(
+                "SELECT fields, updated FROM field_catalog WHERE idx = ? AND sourcetype = ? AND event_code = ?",
+                (index, sourcetype, event_code)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (None, None)
+
+    def store(self, index: str, sourcetype: str, fields_by_code: Dict[str, dict]):
+        now = time.time()
+        rows = [(index, sourcetype, code, json.dumps(fields), now) for code, fields in fields_by_code.items()]
+        with span("file", "field_catalog", rows=len(rows), bytes=sum(len(row[3]) for row in rows)), self._lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO field_catalog (idx, sourcetype, event_code, fields, updated) VALUES (?, ?, ?, ?, ?)",
+                rows)
+            self.db.commit()
+
+    def _fetch(self, event_codes, index, sourcetype, on_progress=None):
+        return self.fetcher(event_codes, index=index, sourcetype=None if sourcetype == ANY_SOURCETYPE else sourcetype,
+                            on_progress=on_progress)
+
+    def refresh(self, event_codes: List[str], index: str = "main", sourcetype: str = ANY_SOURCETYPE,
+                on_progress: Optional[Callable] = None) -> Dict[str, dict]:
+        """Re-run schema discovery for event_codes and store the result."""
+        fields_by_code = self._fetch(event_codes, index, sourcetype, on_progress)
+        self.store(index, sourcetype, fields_by_code)
+        return fields_by_code
+
+    def _refresh_in_background(self, event_codes, index, sourcetype):
+        keys = {(index, sourcetype, code) for code in event_codes}
+        with self._lock:
+            event_codes = [code for code in event_codes if (index, sourcetype, code) not in self._refreshing]
+            self._refreshing |= keys
+        if not event_codes:
+            return
+
+        def work():
+            try:
+                self.refresh(event_codes, index, sourcetype)
+            except Exception as e:
+                print(f"Field catalog refresh failed for {event_codes}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing -= keys
+
+        threading.Thread(target=work, name="field-catalog-refresh", daemon=True).start()
+
+    def get(self, event_codes: List[str], index: str = "main", sourcetype: str = ANY_SOURCETYPE,
+            on_progress: Optional[Callable] = None) -> Dict[str, dict]:
+        """
+        Return the fields for every code, fetching only codes that are not in the catalog.
+
+        on_progress is passed to the fetcher for the misses; background refreshes of stale
+        entries run without it.
+
+        Returns:
+        - dict: {event_code: {field_name: {"distinct_count": int, "type": str}}}
+        """
+        found, stale, missing = {}, [], []
+        for code in event_codes:
+            fields, updated = self._lookup(index, sourcetype, code)
+            if fields is None or (not fields and time.time() - updated > self.negative_ttl):
+                missing.append(code)
+                continue
+            found[code] = fields
+            if time.time() - updated > self.ttl:
+                stale.append(code)
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            found.update(self.refresh(missing, index, sourcetype, on_progress))
+        if stale:
+            self._refresh_in_background(stale, index, sourcetype)
+        return {code: found.get(code, {}) for code in event_codes}
+
+    def invalidate(self, index: Optional[str] = None, sourcetype: Optional[str] = None, event_code: Optional[str] = None) -> int:
+        """Delete matching entries (all of them when no filter is given). Returns the number removed."""
+        clauses, params = [], []
+        for column, value in (("idx", index), ("sourcetype", sourcetype), ("event_code", event_code)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            removed = self.db.execute(f"DELETE FROM field_catalog{where}", params).rowcount
+            self.db.commit()
+        return removed
+
+    def entries(self):
+        with self._lock:
+            return self.db.execute(
+                "SELECT idx, sourcetype, event_code, fields, updated FROM field_catalog ORDER BY idx, sourcetype, event_code").fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the SplunkGPT field catalog.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Show cached entries")
+    invalidate = sub.add_parser("invalidate", help="Drop cached entries so the next objective re-discovers them")
+    invalidate.add_argument("--index")
+    invalidate.add_argument("--sourcetype")
+    invalidate.add_argument("--code", dest="event_code")
+    args = parser.parse_args(argv)
+
+    catalog = FieldCatalog()
+    if args.command == "list":
+        for index, sourcetype, code, fields, updated in catalog.entries():
+            age_hours = (time.time() - updated) / 3600
+            print(f"index={index} sourcetype={sourcetype} EventCode={code} fields={len(json.loads(fields))} age={age_hours:.1f}h")
+    else:
+        removed = catalog.invalidate(args.index, args.sourcetype, args.event_code)
+        print(f"Removed {removed} catalog entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 # Standard Libraries
+import functools
 import json
 import os
-import requests
+import threading
+import time
 
 # Suppressing warnings from urllib3
 import urllib3
@@ -11,33 +13,41 @@ urllib3.disable_warnings()
 from dotenv import load_dotenv
 
 # Imports related to LangChain
+import langchain
 from langchain import LLMChain, PromptTemplate
-from langchain.agents import AgentExecutor, AgentType, Tool, initialize_agent, load_tools, ZeroShotAgent
+from langchain.chains import RetrievalQA
 from langchain.chat_models import ChatOpenAI
 from langchain.document_loaders import TextLoader
 from langchain.embeddings import OpenAIEmbeddings
-from langchain.llms import OpenAI
-from langchain.memory import ConversationSummaryBufferMemory
-from langchain.prompts import MessagesPlaceholder
-from langchain.schema import SystemMessage
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import FAISS
 
 # Other utilities and types
 from bs4 import BeautifulSoup
-from pydantic import BaseModel, Field
-from typing import Any, Dict, List, Optional, Type
+from typing import Callable
 
 # Imports related to Splunk
-import splunklib.client as client
 import splunklib.results as results
-from splunklib.binding import HTTPError
-
-# Streamlit for web app interface
-import streamlit as st
 
 # Local import for prompts
-from prompts import *
+from prompts import (event_id_prompt, research_planner_prompt, research_writer_prompt, spl_filter_agent,
+                     spl_merge_agent, spl_normalize_agent, spl_refactor_agent, spl_statistical_analysis_agent,
+                     spl_writer_agent, spl_writer_agent_testing, splunk_human_input_agent, summarize_splunk_results,
+                     task_assigner_agent, tasks_context_agent, tasks_details_agent, tasks_details_agent_testing,
+                     tasks_human_agent, tasks_initializer_prompt)
+from embedding_cache import CachedEmbeddings
+from field_catalog import FieldCatalog
+from http_cache import HTTPCache, normalize_text, normalize_url
+from instrumentation import span
+from inventory import SplunkInventory
+from llm_cache import LLM_CACHE_SEMANTIC, PersistentLLMCache
+from ratelimit import LLMRateLimiter
+from research import ResearchEngine
+from scheduler import merge_drafts
+from schema_index import SCHEMA_INDEX_EMBEDDINGS, FieldIndex
+from splunk_jobs import SplunkJobManager, normalize_query
+from splunk_session import SPLUNK_ERRORS, SplunkSessionPool
+from token_budget import TokenBudget
+from tokens import count_tokens
 
 # Load environment variables
 load_dotenv()
@@ -49,49 +59,130 @@ splunk_url = os.getenv('SPLUNK_URL')
 splunk_username = os.getenv('SPLUNK_USERNAME')
 splunk_password = os.getenv('SPLUNK_PASSWORD')
 
-llm = ChatOpenAI(model_name="gpt-3.5-turbo-16k", temperature=0.0)
-llm4 = ChatOpenAI(model_name="gpt-4", temperature=0.0)
+#
+# Shared resources, built on first use
+#
+'''
+Importing this module builds nothing. Each client, cache, store and chain below is built
+the first time it is used: once per process and thread-safe. It is then reused by every
+Streamlit rerun and session, batch worker and research thread. The old module-level
+names (helpers.llm, helpers.start_chain, helpers.field_catalog, ...) still resolve
+through the module __getattr__ at the bottom of this file. They build the resource on
+first access.
+'''
+def lazy(build: Callable) -> Callable:
+    """Decorator: build() runs on the first call only; every later call returns the same object."""
+    lock = threading.Lock()
+    built = []
+
+    @functools.wraps(build)
+    def get():
+        if not built:
+            with lock:
+                if not built:
+                    built.append(build())
+        return built[0]
+    get.built = lambda: bool(built)
+    return get
+
+
+# search() and scrape_website() share one pooled session and an on-disk response cache
+@lazy
+def get_http_cache() -> HTTPCache:
+    return HTTPCache()
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600)))
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Caps concurrent LLM calls and backs off together on rate limits
+llm_limiter = LLMRateLimiter()
+
+# Fits prompt variables into each model's context window and tracks per-chain token usage;
+# every chain call goes through llm_limiter
+token_budget = TokenBudget(limiter=llm_limiter)
+
+# Authenticated, keep-alive Splunk sessions shared by every search
+@lazy
+def get_splunk_pool() -> SplunkSessionPool:
+    return SplunkSessionPool(splunk_url, splunk_username, splunk_password)
+
+@lazy
+def get_job_manager() -> SplunkJobManager:
+    return SplunkJobManager(get_splunk_pool())
+
+# Corpus ingest, Local_Search queries and the semantic LLM cache share one content-addressed embedding cache
+@lazy
+def get_embeddings() -> CachedEmbeddings:
+    return CachedEmbeddings(OpenAIEmbeddings(openai_api_key=openai_api_key))
+
+# Every ChatOpenAI call checks the persistent response cache first
+@lazy
+def get_llm_cache() -> PersistentLLMCache:
+    templates = {name: prompt.template for name, prompt in CHAIN_PROMPTS.items()}
+    templates["summary_map"] = summary_map_prompt.template
+    cache = PersistentLLMCache(embeddings=get_embeddings() if LLM_CACHE_SEMANTIC else None, templates=templates)
+    langchain.llm_cache = cache
+    return cache
+
+# Ranks each EventCode's fields against the task so prompts only carry the relevant ones
+@lazy
+def get_field_index() -> FieldIndex:
+    return FieldIndex(embeddings=get_embeddings() if SCHEMA_INDEX_EMBEDDINGS else None)
+
+@lazy
+def get_llm() -> ChatOpenAI:
+    # the response cache has to be in place before the first call
+    get_llm_cache()
+    return ChatOpenAI(model_name="gpt-3.5-turbo-16k", temperature=0.0)
+
+@lazy
+def get_llm4() -> ChatOpenAI:
+    get_llm_cache()
+    return ChatOpenAI(model_name="gpt-4", temperature=0.0)
 
 #model_id = 'meta-llama/Llama-2-7b-chat-hf'
 
 #
 # Chains
 #
-start_chain = LLMChain(llm=llm, prompt=tasks_initializer_prompt, verbose=False)
-detial_chain = LLMChain(llm=llm, prompt=tasks_details_agent, verbose=False)
-tasks_context_chain = LLMChain(llm=llm, prompt=tasks_context_agent, verbose=False)
-tasks_human_chain = LLMChain(llm=llm, prompt=tasks_human_agent, verbose=False)
-task_assigner_chain = LLMChain(llm=llm, prompt=task_assigner_agent, verbose=False)
-spl_writer_chain = LLMChain(llm=llm, prompt=spl_writer_agent, verbose=False)
-spl_refactor_chain = LLMChain(llm=llm, prompt=spl_refactor_agent, verbose=False)
-event_id_chain = LLMChain(llm=llm, prompt=event_id_prompt, verbose=False)
-spl_normalize_chain = LLMChain(llm=llm, prompt=spl_normalize_agent, verbose=False)
-spl_summary_chain = LLMChain(llm=llm, prompt=summarize_splunk_results, verbose=False)
-spl_writer_agent_testing_chain = LLMChain(llm=llm, prompt=spl_writer_agent_testing, verbose=False)
-tasks_details_agent_testing_chain = LLMChain(llm=llm, prompt=tasks_details_agent_testing, verbose=False)
-spl_filter_agent_chain = LLMChain(llm=llm, prompt=spl_filter_agent, verbose=False)
-spl_statistical_analysis_chain = LLMChain(llm=llm, prompt=spl_statistical_analysis_agent, verbose=False)
-spl_statistical_analysis_chain = LLMChain(llm=llm, prompt=spl_statistical_analysis_agent, verbose=False)
-splunk_human_input_agent_chain = LLMChain(llm=llm, prompt=splunk_human_input_agent, verbose=False)
+CHAIN_PROMPTS = {
+    "start_chain": tasks_initializer_prompt,
+    "detial_chain": tasks_details_agent,
+    "tasks_context_chain": tasks_context_agent,
+    "tasks_human_chain": tasks_human_agent,
+    "task_assigner_chain": task_assigner_agent,
+    "spl_writer_chain": spl_writer_agent,
+    "spl_refactor_chain": spl_refactor_agent,
+    "spl_merge_chain": spl_merge_agent,
+    "event_id_chain": event_id_prompt,
+    "spl_normalize_chain": spl_normalize_agent,
+    "spl_summary_chain": summarize_splunk_results,
+    "spl_writer_agent_testing_chain": spl_writer_agent_testing,
+    "tasks_details_agent_testing_chain": tasks_details_agent_testing,
+    "spl_filter_agent_chain": spl_filter_agent,
+    "spl_statistical_analysis_chain": spl_statistical_analysis_agent,
+    "splunk_human_input_agent_chain": splunk_human_input_agent,
+    "research_planner_chain": research_planner_prompt,
+    "research_writer_chain": research_writer_prompt,
+}
+_chains = {}
+_chains_lock = threading.Lock()
+
+def get_chain(name: str) -> LLMChain:
+    """The LLMChain for one of CHAIN_PROMPTS, built on first use."""
+    chain = _chains.get(name)
+    if chain is None:
+        with _chains_lock:
+            if name not in _chains:
+                _chains[name] = LLMChain(llm=get_llm(), prompt=CHAIN_PROMPTS[name], verbose=False)
+            chain = _chains[name]
+    return chain
 
 # End Chains
 
 #
 # Helper Functions/Classes
 #
-class ScrapeWebsiteInput(BaseModel):
-    """Inputs for scrape_website"""
-    objective: str = Field(
-        description="The objective & task that users give to the agent")
-    url: str = Field(description="The url of the website to be scraped")
-class ScrapeWebsiteTool(BaseTool):
-    name = "scrape_website"
-    description = "useful when you need to get data from a website url, passing both url and objective to the function; DO NOT make up any url, the url should only be from the search results"
-    args_schema: Type[BaseModel] = ScrapeWebsiteInput
-    def _run(self, objective: str, url: str):
-        return scrape_website(objective, url)
-    def _arun(self, url: str):
-        raise NotImplementedError("error here")
 def search(query):
     '''
     Purpose:
@@ -104,7 +195,8 @@ def search(query):
         'X-API-KEY': serper_api_key,
         'Content-Type': 'application/json'
     }
-    response = requests.request("POST", url, headers=headers, data=payload)
+    response = get_http_cache().request("POST", url, cache_key=f"serper:{normalize_text(query)}", ttl=SEARCH_CACHE_TTL,
+                                  headers=headers, data=payload)
     #print(response.text)
     return response.text
 def scrape_website(objective: str, url: str):
@@ -124,81 +216,227 @@ def scrape_website(objective: str, url: str):
     data_json = json.dumps(data)
     # Send the POST request
     post_url = f"https://chrome.browserless.io/content?token={browserless_api_key}"
-    response = requests.post(post_url, headers=headers, data=data_json)
+    response = get_http_cache().request("POST", post_url, cache_key=f"page:{normalize_url(url)}", ttl=PAGE_CACHE_TTL,
+                                  headers=headers, data=data_json)
 
     # Check the response status code
     if response.status_code == 200:
         soup = BeautifulSoup(response.content, "html.parser")
         text = soup.get_text()
+        # summary() returns pages that already fit SUMMARY_CONTEXT_BUDGET unchanged
         output = summary(objective, text)
         return output
-        # if len(text) > 10000:
-        #     output = summary(objective, text)
-        #     return output
-        # else:
-        #     return text
     else:
         print(f"HTTP request failed with status code {response.status_code}")
-def summary(objective, content):
-    '''
-    Purpose:
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+SUMMARY_CHUNK_OVERLAP = int(os.getenv("SUMMARY_CHUNK_OVERLAP", "150"))
+SUMMARY_CONTEXT_BUDGET = int(os.getenv("SUMMARY_CONTEXT_BUDGET", "6000"))
+SUMMARY_MAX_DEPTH = int(os.getenv("SUMMARY_MAX_DEPTH", "3"))
 
-    returns:
-    '''
-    text_splitter = RecursiveCharacterTextSplitter(separators=["\n\n", "\n"], chunk_size=10000, chunk_overlap=500)
-    docs = text_splitter.create_documents([content])
-    map_prompt = """
+summary_map_prompt = PromptTemplate(template="""
     Write a summary of the following text for {objective}. It is important that you include relevant Windows Event ID, Field Names, expected values for given fields.
     These will be important when using the summary as context to build a Splunk SPL detection query.
 
     TEXT:
     "{text}"
     SUMMARY:
+    """, input_variables=["text", "objective"])
+
+def summary(objective, content, depth=0):
+    '''
+    Purpose: map-reduce summary of a scraped page, sized in tiktoken tokens.
+    Pages already within SUMMARY_CONTEXT_BUDGET tokens are returned unchanged; longer
+    pages are split into SUMMARY_CHUNK_TOKENS chunks that are summarized concurrently
+    (under llm_limiter) and then combined with one more call. Partial summaries still over
+    the budget are reduced again, at most SUMMARY_MAX_DEPTH times and only while a pass
+    shrinks them; after that the combine call's input is truncated by token_budget.
+
+    returns: str
+    '''
+    content_tokens = count_tokens(content)
+    if content_tokens <= SUMMARY_CONTEXT_BUDGET:
+        return content
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        separators=["\n\n", "\n", " "], chunk_size=SUMMARY_CHUNK_TOKENS, chunk_overlap=SUMMARY_CHUNK_OVERLAP)
+    chunks = text_splitter.split_text(content)
+    summary_chain = LLMChain(llm=get_llm(), prompt=summary_map_prompt, verbose=False)
+    partials = llm_limiter.map(lambda text: token_budget.predict(summary_chain, "summary_map", text=text, objective=objective), chunks)
+    combined = "\n\n".join(partials)
+    combined_tokens = count_tokens(combined)
+    if SUMMARY_CONTEXT_BUDGET < combined_tokens < content_tokens and depth + 1 < SUMMARY_MAX_DEPTH:
+        # still too long for one combine call: reduce the partial summaries the same way
+        return summary(objective, combined, depth + 1)
+    return token_budget.predict(summary_chain, "summary_combine", text=combined, objective=objective)
+
+
+def run_splunk_searches(search_queries: list, timeout: float = None, on_progress=None, **kwargs) -> list:
     """
-    map_prompt_template = PromptTemplate(template=map_prompt, input_variables=["text", "objective"])
-    summary_chain = load_summarize_chain( llm=llm, chain_type='map_reduce', map_prompt=map_prompt_template, combine_prompt=map_prompt_template, verbose=True)
-    output = summary_chain.run(input_documents=docs, objective=objective)
-    return output
+    Run several Splunk searches concurrently as asynchronous jobs.
+
+    Parameters:
+    - search_queries (list): Splunk search queries.
+    - timeout (float): Per-search deadline in seconds; late jobs are cancelled on the server.
+    - on_progress: Optional callback(index, query, progress) called after every poll.
+
+    Returns:
+    - list: One SplunkSearchResult per query, in the same order.
+    """
+    return get_job_manager().run_all(search_queries, timeout=timeout, on_progress=on_progress, **kwargs)
+
+
+SCHEMA_PARALLELISM = int(os.getenv("SCHEMA_PARALLELISM", "4"))
+SCHEMA_CODES_PER_SEARCH = int(os.getenv("SCHEMA_CODES_PER_SEARCH", "4"))
+
 
-def run_splunk_search(search_query: str) -> list:
+def _schema_base_search(index, sourcetype):
+    return f'search index="{index}"' + (f' sourcetype="{sourcetype}"' if sourcetype else "")
+
+
+def _schema_group_query(index, sourcetype, event_codes):
+    codes = ",".join(event_codes)
+    return f'{_schema_base_search(index, sourcetype)} EventCode IN ({codes}) | fields - _raw | stats dc(*) AS * by EventCode'
+
+
+def _schema_code_query(index, sourcetype, event_code):
+    return f'{_schema_base_search(index, sourcetype)} EventCode={event_code} | fieldsummary | table field distinct_count numeric_count count'
+
+
+def fetch_event_code_fields(event_codes: list, index: str = "main", sourcetype: str = None, on_progress=None) -> dict:
     """
-    Run a Splunk search and return the results.
+    Discover the fields present for each EventCode.
+
+    Codes are collapsed into `stats dc(*) by EventCode` searches of SCHEMA_CODES_PER_SEARCH
+    codes each, and those searches run concurrently (SCHEMA_PARALLELISM at a time). Codes
+    a collapsed search could not answer fall back to a per-code fieldsummary, also run
+    concurrently. Codes whose searches failed are left out of the result, so the field
+    catalog does not cache an error as "no fields".
 
     Parameters:
-    - search_query (str): Splunk search query.
+    - event_codes (list): Windows EventCodes as strings.
+    - index (str): Index to search.
+    - sourcetype (str): Optional sourcetype filter.
+    - on_progress: Optional callback(index, query, progress) for the job manager.
 
     Returns:
-    - list: List of search results.
+    - dict: {event_code: {field_name: {"distinct_count": int, "type": "number"|"string"|None}}}
     """
-    service = client.connect(
-        host=splunk_url,
-        username=splunk_username,
-        password=splunk_password,
-        autologin=True
-    )
-
-    kwargs_export = {
-        "earliest": '-7d',
-        "latest_time": "now",
-        "output_mode": 'json'
-    }
+    groups = [event_codes[i:i + SCHEMA_CODES_PER_SEARCH] for i in range(0, len(event_codes), SCHEMA_CODES_PER_SEARCH)]
+    schema = {code: {} for code in event_codes}
+    group_results = run_splunk_searches([_schema_group_query(index, sourcetype, group) for group in groups],
+                                        on_progress=on_progress, max_concurrency=SCHEMA_PARALLELISM)
+    for result in group_results:
+        for row in result:
+            code = str(row.get("EventCode"))
+            if code not in schema:
+                continue
+            for field, value in row.items():
+                if field == "EventCode" or field.startswith("_") or value in ("0", 0, None):
+                    continue
+                schema[code][field] = {"distinct_count": int(value) if str(value).isdigit() else None, "type": None}
+            schema[code]["EventCode"] = {"distinct_count": 1, "type": "number"}
+
+    missing = [code for code, fields in schema.items() if not fields]
+    if missing:
+        code_results = run_splunk_searches([_schema_code_query(index, sourcetype, code) for code in missing],
+                                           on_progress=on_progress, max_concurrency=SCHEMA_PARALLELISM)
+        for code, result in zip(missing, code_results):
+            if result.error:
+                del schema[code]
+                continue
+            for row in result:
+                if not isinstance(row, dict) or "field" not in row:
+                    continue
+                count = int(row.get("count") or 0)
+                numeric = int(row.get("numeric_count") or 0)
+                schema[code][row["field"]] = {
+                    "distinct_count": int(row["distinct_count"]) if str(row.get("distinct_count", "")).isdigit() else None,
+                    "type": "number" if count and numeric == count else "string",
+                }
+    return schema
+
+
+# Field schemas survive across objectives; only unseen EventCodes hit Splunk
+@lazy
+def get_field_catalog() -> FieldCatalog:
+    return FieldCatalog(fetcher=fetch_event_code_fields)
+
+
+# Indexes, sourcetypes and sources, refreshed incrementally from tstats
+@lazy
+def get_splunk_inventory() -> SplunkInventory:
+    return SplunkInventory(lambda search_query, **kwargs: run_splunk_searches([search_query], **kwargs)[0])
+
+
+SPLUNK_STREAM_BATCH = int(os.getenv("SPLUNK_STREAM_BATCH", "200"))
+SPLUNK_MAX_ROWS = int(os.getenv("SPLUNK_MAX_ROWS", "10000"))
+SPLUNK_MAX_BYTES = int(os.getenv("SPLUNK_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+class SplunkResultStream:
+    """
+    Streams a search from the export endpoint as batches of rows.
 
-    try:
-        if not search_query.strip().lower().startswith("search"):
-            search_query = "search " + search_query
-        job = service.jobs.create(search_query)
-        oneshot_results = service.jobs.oneshot(search_query, **kwargs_export)
-        content = results.JSONResultsReader(oneshot_results)
-        return content
+    Iterating yields lists of at most batch_size rows as soon as they arrive. The stream
+    stops early (and closes the HTTP response) once max_rows rows or max_bytes of
+    serialized rows have been read; truncated is then set.
 
-    except HTTPError as e:
-        error_message = str(e)
-        error_portion = error_message.split("Error at position", 1)
-        if len(error_portion) > 1:
-            return f"Error at position {error_portion[1]}"
-        else:
-            print(f"Error: {e}")
-            return e
+    Parameters:
+    - search_query (str): Splunk search query.
+    - batch_size (int): Rows per yielded batch.
+    - max_rows (int), max_bytes (int): Caps on what is read from Splunk.
+    - earliest_time (str), latest_time (str): Search time range.
+    """
+
+    def __init__(self, search_query, batch_size=SPLUNK_STREAM_BATCH, max_rows=SPLUNK_MAX_ROWS, max_bytes=SPLUNK_MAX_BYTES,
+                 earliest_time="-7d", latest_time="now"):
+        self.query = normalize_query(search_query)
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.earliest_time = earliest_time
+        self.latest_time = latest_time
+        self.rows_read = 0
+        self.bytes_read = 0
+        self.truncated = False
+        self.run_duration = None
+        self.messages = []
+        self.error = None
+
+    def __iter__(self):
+        start = time.perf_counter()
+        batch = []
+        with span("splunk", "stream", query=self.query) as trace_span:
+            try:
+                with get_splunk_pool().session() as service:
+                    stream = service.jobs.export(self.query, output_mode="json", search_mode="normal",
+                                                 earliest_time=self.earliest_time, latest_time=self.latest_time)
+                    try:
+                        reader = results.JSONResultsReader(stream)
+                        for item in reader:
+                            if isinstance(item, results.Message):
+                                self.messages.append(f"{item.type}: {item.message}")
+                                continue
+                            if not isinstance(item, dict) or reader.is_preview:
+                                continue
+                            self.rows_read += 1
+                            self.bytes_read += len(json.dumps(item))
+                            batch.append(item)
+                            if len(batch) >= self.batch_size:
+                                yield batch
+                                batch = []
+                            if self.rows_read >= self.max_rows or self.bytes_read >= self.max_bytes:
+                                self.truncated = True
+                                break
+                    finally:
+                        stream.close()
+                if batch:
+                    yield batch
+            except SPLUNK_ERRORS as e:
+                self.error = str(e) or type(e).__name__
+            finally:
+                self.run_duration = time.perf_counter() - start
+                trace_span.set(rows=self.rows_read, bytes=self.bytes_read, run_duration=self.run_duration,
+                               truncated=self.truncated, error=self.error)
 
 
 #
@@ -206,55 +444,92 @@ def run_splunk_search(search_query: str) -> list:
 #
 
 def handle_splunk_executor_agent(task, spl_command):
-    results_list = [item for item in run_splunk_search(spl_command)]
-    return results_list
+    return SplunkResultStream(spl_command)
+
+def task_text(task):
+    return f"{task.get('description', '')}\n{task.get('isolated_context', '')}"
 
-def handle_spl_writer_agent(task, objective, schema, splunk_info):
-    st.markdown("<span style='color: blue;'>Writing Some SPL ...</span>", unsafe_allow_html=True)
-    return spl_writer_chain.predict(objective=objective, task=task["description"], isolated_context=task["isolated_context"], splunk_info=splunk_info,schema=schema)
+def handle_spl_writer_agent(task, objective, schema, splunk_info, research=""):
+    schema = get_field_index().prune(schema, task_text(task), research)
+    return token_budget.predict(get_chain("spl_writer_chain"), "spl_writer_chain", objective=objective, task=task["description"], isolated_context=task["isolated_context"], splunk_info=splunk_info,schema=schema)
 
 def handle_spl_filter_agent(task, objective, spl_command):
-    st.markdown("<span style='color: blue;'>Applying SPL Filters ...</span>", unsafe_allow_html=True)
-    return spl_filter_agent_chain.predict(objective=objective, task=task["description"], previous_query=spl_command, isolated_context=task["isolated_context"])
+    return token_budget.predict(get_chain("spl_filter_agent_chain"), "spl_filter_agent_chain", objective=objective, task=task["description"], previous_query=spl_command, isolated_context=task["isolated_context"])
 
 def handle_spl_statistical_analysis_agent(task, objective, spl_command):
-    st.markdown("<span style='color: blue;'>Applying SPL Statistical Analysis ...</span>", unsafe_allow_html=True)
-    return spl_statistical_analysis_chain.predict(objective=objective, task=task["description"], previous_query=spl_command, isolated_context=task["isolated_context"])
+    return token_budget.predict(get_chain("spl_statistical_analysis_chain"), "spl_statistical_analysis_chain", objective=objective, task=task["description"], previous_query=spl_command, isolated_context=task["isolated_context"])
 
-def handle_spl_refactor_agent(task, objective, spl_command, splunk_info, schema):
-    st.markdown("<span style='color: blue;'>Refactoring SPL ...</span>", unsafe_allow_html=True)
-    return spl_normalize_chain.predict(existing_spl=spl_command, objective=objective, splunk_info=splunk_info, schema=schema)
+def handle_spl_merge_agent(task, objective, drafts):
+    # drafts: [(task id, spl), ...] of the dependencies of a fan-in task
+    return token_budget.predict(get_chain("spl_merge_chain"), "spl_merge_chain", objective=objective, task=task.get("description", ""), spl_drafts=merge_drafts(drafts))
+
+def handle_spl_refactor_agent(task, objective, spl_command, splunk_info, schema, research=""):
+    # the SPL itself names the fields that must survive pruning
+    schema = get_field_index().prune(schema, f"{task_text(task)}\n{spl_command}", research)
+    return token_budget.predict(get_chain("spl_normalize_chain"), "spl_normalize_chain", existing_spl=spl_command, objective=objective, splunk_info=splunk_info, schema=schema)
 
 def handle_spl_results_agent(objective, query, splunk_results):
-    final_data=[]
-    for item in splunk_results:
-        #print(item)
-        final_data.append(item)
-    return spl_summary_chain.predict(objective=objective, query=query, results=final_data)
+    # pandas is only loaded once there are results to digest
+    from results_digest import build_results_digest
+    # The LLM sees a fixed-size digest computed locally over every row, not the rows themselves
+    return token_budget.predict(get_chain("spl_summary_chain"), "spl_summary_chain", objective=objective, query=query, results=build_results_digest(splunk_results))
     
 
 ### END HELPER ###
 
 
 ### Start TOOLS ###
-loader = TextLoader('./content/BlogPostSplunkGPT.txt')
-doc = loader.load()
+LOCAL_CORPUS = ['./content/BlogPostSplunkGPT.txt']
 text_splitter = RecursiveCharacterTextSplitter(chunk_size=3000, chunk_overlap=400)
-docs = text_splitter.split_documents(doc)
-embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
-docsearch = FAISS.from_documents(docs, embeddings)
-qa = RetrievalQA.from_chain_type(llm=llm, chain_type="stuff", retriever=docsearch.as_retriever())
-research_tools = [
-Tool(
-    name="Internet_Search",
-    func=search,
-    description="Internet Search: useful for when you need to answer questions about current events, internet data. You should ask targeted questions"
-),
-ScrapeWebsiteTool(),
-Tool(
-    name="Local_Search",
-    func=qa.run,
-    description="Local Search: useful for when you need to answer questions about current events, using local data. You should ask targeted questions",
-),]
-
-### END TOOLS ###
\ No newline at end of file
+
+@lazy
+def get_vector_store():
+    # faiss is only loaded once local search is actually used
+    from vectorstore import PersistentVectorStore
+    vector_store = PersistentVectorStore(get_embeddings())
+    # Only files whose content hash changed since the last run are re-embedded
+    vector_store.sync(LOCAL_CORPUS, text_splitter, TextLoader)
+    return vector_store
+
+@lazy
+def get_docsearch():
+    return get_vector_store().as_faiss()
+
+@lazy
+def get_qa() -> RetrievalQA:
+    return RetrievalQA.from_chain_type(llm=get_llm(), chain_type="stuff", retriever=get_docsearch().as_retriever())
+
+def local_search(query):
+    return get_qa().run(query)
+
+@lazy
+def get_research_engine() -> ResearchEngine:
+    return ResearchEngine(get_chain("research_planner_chain"), get_chain("research_writer_chain"), search=search,
+                          scrape=scrape_website, local_search=local_search, predict=token_budget.predict)
+
+### END TOOLS ###
+
+
+# Module-level names kept from before lazy initialization; each access goes through its getter
+LAZY_RESOURCES = {
+    "http_cache": get_http_cache,
+    "splunk_pool": get_splunk_pool,
+    "job_manager": get_job_manager,
+    "embeddings": get_embeddings,
+    "field_index": get_field_index,
+    "llm": get_llm,
+    "llm4": get_llm4,
+    "field_catalog": get_field_catalog,
+    "splunk_inventory": get_splunk_inventory,
+    "vector_store": get_vector_store,
+    "docsearch": get_docsearch,
+    "qa": get_qa,
+    "research_engine": get_research_engine,
+}
+
+def __getattr__(name):
+    if name in LAZY_RESOURCES:
+        return LAZY_RESOURCES[name]()
+    if name in CHAIN_PROMPTS:
+        return get_chain(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,234 @@
+'''
+On-disk HTTP response cache shared by search() and scrape_website().
+
+Responses are keyed by a caller-supplied normalized key (the serper query or the
+scraped page URL), kept for a TTL, revalidated with ETag/Last-Modified once stale and
+evicted least-recently-used past HTTP_CACHE_MAX_BYTES. All requests go through one
+pooled requests.Session.
+
+With HTTP_CACHE_OFFLINE set, nothing touches the network: every lookup is answered
+from the cache (fresh or not) and a miss raises OfflineCacheMiss. Recorded responses
+can be moved between machines as JSONL:
+    python http_cache.py export recordings.jsonl
+    python http_cache.py import recordings.jsonl
+'''
+# Standard Libraries
+import argparse
+import base64
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import span
+
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", os.path.join(os.getcwd(), "http_cache.db"))
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+HTTP_CACHE_OFFLINE = os.getenv("HTTP_CACHE_OFFLINE", "False").lower() in ("1", "true", "yes")
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+
+
+class OfflineCacheMiss(Exception):
+    """Raised in offline mode when no recorded response exists for a key."""
+
+
+def normalize_url(url: str) -> str:
+    """Lower-case scheme and host, drop the fragment and tracking parameters, sort the query string."""
+    parts = urlsplit(url.strip())
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not k.lower().startswith("utm_"))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class CachedResponse:
+    """The subset of requests.Response that callers use, plus from_cache."""
+
+    def __init__(self, status_code: int, content: bytes, headers: dict, from_cache: bool):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.from_cache = from_cache
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+
+def _pooled_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class HTTPCache:
+    """
+    Parameters:
+    - path (str): SQLite file holding the responses.
+    - max_bytes (int): Upper bound on stored body bytes.
+    - offline (bool): Serve only from the cache.
+    """
+
+    def __init__(self, path: str = HTTP_CACHE_PATH, max_bytes: int = HTTP_CACHE_MAX_BYTES,
+                 offline: bool = HTTP_CACHE_OFFLINE, session: Optional[requests.Session] = None):
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.session = session or _pooled_session(HTTP_POOL_SIZE)
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                expires REAL NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used);
+        """)
+
+    @staticmethod
+    def _hash(cache_key: str) -> str:
+        return hashlib.sha256(cache_key.encode("utf-8")).hexdigest()
+
+    def _get(self, key):
+        with self._lock:
+            row = self.db.execute(
+                "SELECT status, headers, body, etag, last_modified, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                self.db.commit()
+        return row
+
+    def _put(self, key, status, headers, body, etag, last_modified, ttl):
+        now = time.time()
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, status, headers, body, etag, last_modified, expires, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, status, json.dumps(headers), body, etag, last_modified, now + ttl, len(body), now))
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def request(self, method: str, url: str, cache_key: str, ttl: float, **kwargs) -> CachedResponse:
+        """
+        Send a request through the cache.
+
+        Parameters:
+        - method (str), url (str): As for requests.
+        - cache_key (str): Normalized identity of the request (e.g. "serper:<query>").
+        - ttl (float): Seconds a stored response is served without revalidation.
+        - kwargs: Passed to requests.Session.request.
+
+        Returns:
+        - CachedResponse: The live or cached response. Only 2xx responses are stored.
+        """
+        with span("web", cache_key.split(":", 1)[0], key=cache_key) as trace_span:
+            response = self._request(method, url, cache_key, ttl, **kwargs)
+            trace_span.set(status=response.status_code, bytes=len(response.content), cache_hits=int(response.from_cache))
+            return response
+
+    def _request(self, method, url, cache_key, ttl, **kwargs) -> CachedResponse:
+        key = self._hash(cache_key)
+        cached = self._get(key)
+        if cached is not None and (self.offline or cached[5] > time.time()):
+            self.hits += 1
+            return CachedResponse(cached[0], cached[2], json.loads(cached[1]), True)
+        if self.offline:
+            raise OfflineCacheMiss(cache_key)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached is not None:
+            if cached[3]:
+                headers["If-None-Match"] = cached[3]
+            if cached[4]:
+                headers["If-Modified-Since"] = cached[4]
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        response = self.session.request(method, url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            self.revalidated += 1
+            self._put(key, cached[0], json.loads(cached[1]), cached[2], cached[3], cached[4], ttl)
+            return CachedResponse(cached[0], cached[2], json.loads(cached[1]), True)
+
+        self.misses += 1
+        response_headers = dict(response.headers)
+        if 200 <= response.status_code < 300:
+            self._put(key, response.status_code, response_headers, response.content,
+                      response.headers.get("ETag"), response.headers.get("Last-Modified"), ttl)
+        return CachedResponse(response.status_code, response.content, response_headers, False)
+
+    #
+    # Recordings
+    #
+    def export(self, path: str) -> int:
+        with self._lock:
+            rows = self.db.execute("SELECT key, status, headers, body, etag, last_modified FROM responses").fetchall()
+        with open(path, 'w') as file:
+            for key, status, headers, body, etag, last_modified in rows:
+                file.write(json.dumps({"key": key, "status": status, "headers": json.loads(headers),
+                                       "body": base64.b64encode(body).decode("ascii"),
+                                       "etag": etag, "last_modified": last_modified}) + "\n")
+        return len(rows)
+
+    def load(self, path: str, ttl: float = 365 * 24 * 3600) -> int:
+        count = 0
+        with open(path, 'r') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self._put(record["key"], record["status"], record["headers"], base64.b64decode(record["body"]),
+                          record.get("etag"), record.get("last_modified"), ttl)
+                count += 1
+        return count
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import recorded HTTP responses.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="JSONL recordings file")
+    args = parser.parse_args(argv)
+    cache = HTTPCache()
+    if args.command == "export":
+        print(f"Exported {cache.export(args.path)} responses")
+    else:
+        print(f"Imported {cache.load(args.path)} responses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+'''
+Ingest a directory of threat-intel documents (PDF, HTML, text) into the Local_Search vector store.
+
+Usage:
+    python ingest.py <directory> [--workers N] [--batch-size N] [--prune]
+
+Text extraction and chunking run in a process pool. Chunks are streamed into the
+embedding and FAISS stages in bounded batches, so memory does not grow with the
+size of the corpus. Files whose sha256 matches the stored manifest are skipped.
+Nothing is committed until the final store.save() has written the index, so an
+interrupted run leaves the store as it was and the next run redoes the changed files.
+'''
+# Standard Libraries
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# .env for environment variables
+from dotenv import load_dotenv
+
+from langchain.embeddings import OpenAIEmbeddings
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from embedding_cache import CachedEmbeddings
+from vectorstore import PersistentVectorStore, file_digest
+
+load_dotenv()
+
+TEXT_EXTENSIONS = {".txt", ".md", ".csv", ".json", ".log"}
+HTML_EXTENSIONS = {".html", ".htm"}
+PDF_EXTENSIONS = {".pdf"}
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | HTML_EXTENSIONS | PDF_EXTENSIONS
+
+CHUNK_SIZE = 3000
+CHUNK_OVERLAP = 400
+
+
+def walk_corpus(root: str):
+    """Yield every supported file below root, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield os.path.abspath(os.path.join(dirpath, name))
+
+
+def extract_text(path: str) -> str:
+    """Extract plain text from a PDF, HTML or text file."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PDF_EXTENSIONS:
+        from PyPDF2 import PdfReader
+        reader = PdfReader(path)
+        return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+    if ext in HTML_EXTENSIONS:
+        from bs4 import BeautifulSoup
+        with open(path, 'rb') as file:
+            soup = BeautifulSoup(file.read(), "html.parser")
+        for tag in soup(["script", "style", "noscript"]):
+            tag.decompose()
+        return soup.get_text("\n")
+    with open(path, 'r', encoding="utf-8", errors="replace") as file:
+        return file.read()
+
+
+def extract_chunks(path: str, digest: str):
+    """
+    Worker: extract and split one file.
+
+    Returns:
+    - tuple: (path, digest, list of chunk strings, error message or None)
+    """
+    try:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        return path, digest, splitter.split_text(extract_text(path)), None
+    except Exception as e:
+        return path, digest, [], f"{type(e).__name__}: {e}"
+
+
+class IngestStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.documents = 0
+        self.chunks = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def report(self, final: bool = False) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        line = (f"{'Done' if final else 'Progress'}: {self.documents} docs ({self.documents / elapsed:.1f} docs/sec), "
+                f"{self.chunks} chunks ({self.chunks / elapsed:.1f} chunks/sec), "
+                f"{self.skipped} unchanged, {self.failed} failed, {elapsed:.1f}s")
+        print(line, flush=True)
+        return line
+
+
+def ingest_directory(root: str, store: PersistentVectorStore, workers: int = None, batch_size: int = 64,
+                     prune: bool = False) -> IngestStats:
+    """
+    Stream a directory into the vector store.
+
+    Parameters:
+    - root (str): Directory to walk.
+    - store (PersistentVectorStore): Target store.
+    - workers (int): Extraction processes (defaults to os.cpu_count()).
+    - batch_size (int): Chunks per embedding/FAISS batch.
+    - prune (bool): Remove sources under root that no longer exist.
+
+    Returns:
+    - IngestStats: Throughput counters.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    stats = IngestStats()
+    seen = set()
+    batch = []
+    # chunks still waiting in the batch for each source; a source is marked current once they are flushed
+    pending = {}
+
+    def flush():
+        if not batch:
+            return
+        stats.chunks += store.add_batch(batch)
+        for source in {source for source, _, _ in batch}:
+            pending[source][1] -= sum(1 for s, _, _ in batch if s == source)
+            if pending[source][1] == 0:
+                store.mark_source(source, pending.pop(source)[0])
+        batch.clear()
+
+    def consume(future):
+        path, digest, chunks, error = future.result()
+        if error:
+            stats.failed += 1
+            print(f"Failed to extract {path}: {error}", file=sys.stderr)
+            return
+        store.remove_source(path)
+        stats.documents += 1
+        if not chunks:
+            store.mark_source(path, digest)
+            return
+        pending[path] = [digest, len(chunks)]
+        for i, chunk in enumerate(chunks):
+            batch.append((path, chunk, {"source": path, "chunk": i}))
+            if len(batch) >= batch_size:
+                flush()
+        if stats.documents % 50 == 0:
+            stats.report()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = set()
+            for path in walk_corpus(root):
+                seen.add(path)
+                digest = file_digest(path)
+                if store.is_current(path, digest):
+                    stats.skipped += 1
+                    continue
+                # bounded submission keeps at most max_in_flight extracted documents in memory
+                while len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        consume(future)
+                in_flight.add(pool.submit(extract_chunks, path, digest))
+            for future in in_flight:
+                consume(future)
+        flush()
+
+        if prune:
+            prefix = os.path.abspath(root) + os.sep
+            for source in store.sources():
+                if source.startswith(prefix) and source not in seen:
+                    store.remove_source(source)
+        store.save()
+    except BaseException:
+        # nothing of this run was committed; leave the store exactly as it was
+        store.discard()
+        raise
+    stats.report(final=True)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest documents into the SplunkGPT Local_Search vector store.")
+    parser.add_argument("directory", help="Directory of PDF, HTML and text documents")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding batch")
+    parser.add_argument("--prune", action="store_true", help="Remove documents that were deleted from the directory")
+    args = parser.parse_args(argv)
+
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY")))
+    store = PersistentVectorStore(embeddings)
+    ingest_directory(args.directory, store, workers=args.workers, batch_size=args.batch_size, prune=args.prune)
+
+
+if __name__ == "__main__":
+    main()
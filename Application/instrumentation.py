@@ -0,0 +1,184 @@
+# Standard Libraries
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+#
+# Per-run spans for chain calls, Splunk searches, web requests and file writes
+#
+'''
+A TraceRun collects the spans of one objective. While a run is active (with run(...)),
+every instrumented call records a span with its wall time and cost:
+- chain: prompt, completion and trimmed tokens;
+- splunk: scanCount, runDuration, rows and bytes of results;
+- web: bytes and whether http_cache answered;
+- file: bytes written.
+
+Each finished span is appended to TRACE_DIR/<run_id>.jsonl. Spans are also totalled per
+stage for the sidebar breakdown. The run and the current stage live in context
+variables: asyncio tasks and asyncio.to_thread inherit them, and thread pools that
+should attribute their work to the caller submit through contextvars.copy_context().run.
+Outside a run, span() records nothing.
+'''
+TRACE_DIR = os.getenv("TRACE_DIR", os.path.join(os.getcwd(), "traces"))
+TRACE_WRITE = os.getenv("TRACE_WRITE", "True").lower() in ("1", "true", "yes")
+
+SPAN_KINDS = ("stage", "chain", "splunk", "web", "file")
+# Numeric span attributes summed into the breakdown; everything else only goes to the trace file
+TOTALLED = ("prompt_tokens", "completion_tokens", "trimmed_tokens", "scanCount", "run_duration", "rows", "bytes", "cache_hits")
+
+_current_run: ContextVar = ContextVar("trace_run", default=None)
+_current_stage: ContextVar = ContextVar("trace_stage", default=None)
+
+
+class Span:
+    __slots__ = ("kind", "name", "stage", "started", "seconds", "attributes")
+
+    def __init__(self, kind: str, name: str, stage: Optional[str], attributes: dict):
+        self.kind = kind
+        self.name = name
+        self.stage = stage
+        self.started = time.time()
+        self.seconds = 0.0
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class _NullSpan:
+    def set(self, **attributes):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class TraceRun:
+    """
+    Spans of one objective, streamed to a JSONL file and totalled per stage and kind.
+
+    Reopening a run_id (e.g. after a Streamlit rerun) appends to the same file and picks
+    up the totals recorded so far.
+
+    Parameters:
+    - run_id (str): Names the trace file.
+    - trace_dir (str): Directory of trace files.
+    - write (bool): Write spans to the trace file.
+    """
+
+    def __init__(self, run_id: str, trace_dir: str = TRACE_DIR, write: bool = TRACE_WRITE):
+        self.run_id = run_id
+        self.path = os.path.join(trace_dir, re.sub(r"[^\w.-]", "_", run_id) + ".jsonl") if write else None
+        self._lock = threading.Lock()
+        self.totals: Dict[tuple, dict] = {}
+        if self.path:
+            os.makedirs(trace_dir, exist_ok=True)
+            if os.path.exists(self.path):
+                self._replay()
+
+    def _replay(self):
+        with open(self.path, 'r') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._add(record.get("stage"), record["kind"], record.get("seconds", 0.0), record)
+
+    def _add(self, stage, kind, seconds, attributes):
+        entry = self.totals.setdefault((stage, kind), {"count": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += seconds
+        for key in TOTALLED:
+            value = attributes.get(key)
+            if isinstance(value, (int, float)):
+                entry[key] = entry.get(key, 0) + value
+
+    def record(self, span: Span):
+        record = {"kind": span.kind, "name": span.name, "stage": span.stage, "started": round(span.started, 3),
+                  "seconds": round(span.seconds, 4), "thread": threading.current_thread().name, **span.attributes}
+        with self._lock:
+            self._add(span.stage, span.kind, span.seconds, span.attributes)
+            if self.path:
+                with open(self.path, 'a') as file:
+                    file.write(json.dumps(record, default=str) + "\n")
+
+    def breakdown(self) -> List[dict]:
+        """One row per stage (in the order stages started): wall time and the cost of each kind of span."""
+        with self._lock:
+            totals = {key: dict(value) for key, value in self.totals.items()}
+        stages = list(dict.fromkeys(stage for stage, _ in totals))
+        rows = []
+        for stage in stages:
+            def get(kind, key):
+                return totals.get((stage, kind), {}).get(key, 0)
+            rows.append({
+                "stage": stage or "(none)",
+                "seconds": round(get("stage", "seconds"), 2),
+                "llm_calls": get("chain", "count"),
+                "llm_seconds": round(get("chain", "seconds"), 2),
+                "tokens": get("chain", "prompt_tokens") + get("chain", "completion_tokens"),
+                "searches": get("splunk", "count"),
+                "scan_count": get("splunk", "scanCount"),
+                "splunk_kb": round(get("splunk", "bytes") / 1024, 1),
+                "web_requests": get("web", "count"),
+                "web_cache_hits": get("web", "cache_hits"),
+                "file_writes": get("file", "count"),
+            })
+        return rows
+
+
+def current_run() -> Optional[TraceRun]:
+    return _current_run.get()
+
+
+@contextmanager
+def run(run_id: str, trace_dir: str = TRACE_DIR):
+    """Make a TraceRun the destination of spans recorded in this context."""
+    trace = TraceRun(run_id, trace_dir)
+    token = _current_run.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_run.reset(token)
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes):
+    """
+    Time the enclosed block and record it in the current run.
+
+    The yielded span's set(**attributes) adds costs known only at the end (tokens,
+    bytes, scanCount). An exception is recorded as the span's error and re-raised.
+    """
+    trace = _current_run.get()
+    if trace is None:
+        yield _NULL_SPAN
+        return
+    current = Span(kind, name, _current_stage.get(), attributes)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        current.seconds = time.perf_counter() - start
+        trace.record(current)
+
+
+@contextmanager
+def stage(name: str):
+    """Tag the spans recorded inside the block with a pipeline stage and time the stage itself."""
+    token = _current_stage.set(name)
+    try:
+        with span("stage", name):
+            yield
+    finally:
+        _current_stage.reset(token)
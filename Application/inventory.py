@@ -0,0 +1,145 @@
+# Standard Libraries
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from instrumentation import span
+
+#
+# Splunk environment inventory
+#
+'''
+Indexes, sourcetypes and sources are discovered with a single tstats search (metadata
+only, no raw events are scanned) and persisted to INVENTORY_PATH. Later refreshes only
+ask for events newer than the latest lastTime already recorded and merge the counts in.
+summary() renders a compact, size-capped description for the prompts.
+'''
+INVENTORY_PATH = os.getenv("INVENTORY_PATH", os.path.join(os.getcwd(), "splunk_inventory.json"))
+INVENTORY_TTL = float(os.getenv("INVENTORY_TTL", "3600"))
+INVENTORY_SUMMARY_CHARS = int(os.getenv("INVENTORY_SUMMARY_CHARS", "2000"))
+
+INVENTORY_SEARCH = "| tstats count min(_time) as firstTime max(_time) as lastTime where index=* by index sourcetype source"
+
+# Used when the inventory is empty, e.g. the first search failed
+DEFAULT_SPLUNK_INFO = """
+    index [main],
+    source [WinEventLog:Application, WinEventLog:Security, WinEventLog:Setup, WinEventLog:System],
+    sourcetype [WinEventLog]
+    """
+
+
+class SplunkInventory:
+    """
+    Locally persisted inventory of (index, sourcetype, source) with event counts and time bounds.
+
+    Parameters:
+    - runner: Callable(search_query, earliest_time=..., latest_time=..., on_progress=...) returning a SplunkSearchResult.
+    - path (str): JSON file holding the inventory.
+    - ttl (float): Seconds before get() triggers an incremental refresh.
+    """
+
+    def __init__(self, runner: Callable, path: str = INVENTORY_PATH, ttl: float = INVENTORY_TTL):
+        self.runner = runner
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}
+        self.refreshed = 0.0
+        self.error: Optional[str] = None
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+            self.entries = data.get("entries", {})
+            self.refreshed = data.get("refreshed", 0.0)
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with span("file", "inventory") as trace_span:
+            with open(tmp_path, 'w') as file:
+                json.dump({"refreshed": self.refreshed, "entries": self.entries}, file)
+            trace_span.set(bytes=os.path.getsize(tmp_path))
+            os.replace(tmp_path, self.path)
+
+    def watermark(self) -> float:
+        """Latest lastTime seen across the inventory (0 when empty)."""
+        return max((entry["lastTime"] for entry in self.entries.values()), default=0.0)
+
+    def refresh(self, full: bool = False, on_progress: Optional[Callable] = None) -> bool:
+        """
+        Update the inventory from Splunk.
+
+        Parameters:
+        - full (bool): Rebuild from all time instead of only events after the watermark.
+        - on_progress: Optional job progress callback passed to the runner.
+
+        Returns:
+        - bool: True if the search succeeded.
+        """
+        with self._lock:
+            incremental = bool(self.entries) and not full
+            earliest = str(int(self.watermark()) + 1) if incremental else "0"
+            result = self.runner(INVENTORY_SEARCH, earliest_time=earliest, latest_time="now", on_progress=on_progress)
+            if result.error:
+                self.error = result.error
+                return False
+            entries = self.entries if incremental else {}
+            for row in result:
+                key = f"{row.get('index')}|{row.get('sourcetype')}|{row.get('source')}"
+                count = int(row.get("count", 0))
+                first_time = float(row.get("firstTime", 0))
+                last_time = float(row.get("lastTime", 0))
+                entry = entries.get(key)
+                if entry is None:
+                    entries[key] = {"index": row.get("index"), "sourcetype": row.get("sourcetype"),
+                                    "source": row.get("source"), "count": count,
+                                    "firstTime": first_time, "lastTime": last_time}
+                else:
+                    entry["count"] += count
+                    entry["firstTime"] = min(entry["firstTime"], first_time)
+                    entry["lastTime"] = max(entry["lastTime"], last_time)
+            self.entries = entries
+            self.refreshed = time.time()
+            self.error = None
+            self._save()
+            return True
+
+    def get(self, on_progress: Optional[Callable] = None) -> Dict[str, dict]:
+        """Return the inventory, refreshing it first if it is empty or older than the TTL."""
+        if not self.entries or time.time() - self.refreshed > self.ttl:
+            self.refresh(on_progress=on_progress)
+        return self.entries
+
+    def summary(self, max_chars: int = INVENTORY_SUMMARY_CHARS, on_progress: Optional[Callable] = None) -> str:
+        """
+        Compact description of the inventory for prompt injection.
+
+        One line per index/sourcetype pair, busiest first, listing its sources and event count.
+        The output is cut at max_chars.
+        """
+        entries = self.get(on_progress=on_progress)
+        if not entries:
+            return DEFAULT_SPLUNK_INFO
+        grouped = {}
+        for entry in entries.values():
+            group = grouped.setdefault((entry["index"], entry["sourcetype"]), {"count": 0, "sources": {}, "lastTime": 0.0})
+            group["count"] += entry["count"]
+            group["lastTime"] = max(group["lastTime"], entry["lastTime"])
+            group["sources"][entry["source"]] = group["sources"].get(entry["source"], 0) + entry["count"]
+        lines = []
+        for (index, sourcetype), group in sorted(grouped.items(), key=lambda item: -item[1]["count"]):
+            sources = sorted(group["sources"], key=lambda source: -group["sources"][source])
+            shown = ", ".join(sources[:8]) + (f", ... (+{len(sources) - 8})" if len(sources) > 8 else "")
+            last_seen = time.strftime("%Y-%m-%d", time.gmtime(group["lastTime"]))
+            lines.append(f"index [{index}], sourcetype [{sourcetype}], source [{shown}], events {group['count']}, last seen {last_seen}")
+        text = ""
+        for shown_count, line in enumerate(lines):
+            if len(text) + len(line) + 1 > max_chars:
+                text += f"... {len(lines) - shown_count} more index/sourcetype pairs\n"
+                break
+            text += line + "\n"
+        return text
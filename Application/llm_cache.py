@@ -0,0 +1,230 @@
+# Standard Libraries
+import hashlib
+import json
+import os
+import sqlite3
+import string
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Imports related to LangChain
+from langchain.cache import BaseCache
+from langchain.load.dump import dumps
+from langchain.load.load import loads
+
+from instrumentation import span
+
+#
+# Persistent LLM response cache
+#
+'''
+Registered as langchain.llm_cache, so every LLMChain, agent and summarize chain that
+goes through ChatOpenAI checks it before calling the API. Entries are keyed by
+sha256(llm_string + prompt); LangChain's llm_string already carries the model name,
+temperature and other call parameters, and the prompt is the fully rendered prompt.
+The SQLite file is capped at LLM_CACHE_MAX_BYTES of stored responses, evicting least
+recently used entries. With LLM_CACHE_SEMANTIC enabled, an exact miss falls back to
+the most similar cached prompt for the same llm_string and prompt template above
+LLM_CACHE_SEMANTIC_THRESHOLD cosine similarity. Prompts are compared on what their
+variables rendered to, with the template's literal text cut out: the shared template
+text would otherwise make prompts that differ only in their task or schema look alike.
+'''
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.getcwd(), "llm_cache.db"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_SEMANTIC = os.getenv("LLM_CACHE_SEMANTIC", "False").lower() in ("1", "true", "yes")
+LLM_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("LLM_CACHE_SEMANTIC_THRESHOLD", "0.97"))
+
+# Embedding models cap the input size; long variable text is compared on its leading part
+SEMANTIC_PROMPT_CHARS = 20000
+
+
+def template_fragments(template: str) -> List[str]:
+    """The literal (non-variable) pieces of a PromptTemplate's f-string template, in order."""
+    return [literal for literal, _, _, _ in string.Formatter().parse(template) if literal.strip()]
+
+
+def message_text(prompt: str) -> str:
+    """The text of a cached prompt: chat models cache dumps(messages), plain LLMs the prompt itself."""
+    try:
+        messages = json.loads(prompt)
+        return "\n".join(message["kwargs"]["content"] for message in messages)
+    except (ValueError, TypeError, KeyError):
+        return prompt
+
+
+class PersistentLLMCache(BaseCache):
+    """
+    SQLite-backed LangChain cache with size-bounded LRU eviction and an optional semantic tier.
+
+    Parameters:
+    - path (str): SQLite file holding the cache.
+    - max_bytes (int): Upper bound on the total size of stored responses.
+    - embeddings: Embeddings used by the semantic tier; None disables it.
+    - threshold (float): Minimum cosine similarity for a semantic hit.
+    - templates (dict): {name: PromptTemplate.template} of the chains, used to find which
+      template a prompt was rendered from and what its variables contributed.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES, embeddings=None,
+                 threshold: float = LLM_CACHE_SEMANTIC_THRESHOLD, templates: Optional[Dict[str, str]] = None):
+        self.max_bytes = max_bytes
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self._templates = {name: template_fragments(template) for name, template in (templates or {}).items()}
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # (llm_string, template) -> (keys, normalized embedding matrix) for the semantic tier
+        self._vectors = {}
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                llm_string TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                embedding BLOB
+            );
+            CREATE INDEX IF NOT EXISTS llm_cache_lru ON llm_cache(last_used);
+            CREATE INDEX IF NOT EXISTS llm_cache_llm ON llm_cache(llm_string);
+        """)
+        if "template" not in [column[1] for column in self.db.execute("PRAGMA table_info(llm_cache)")]:
+            # embeddings stored before templates were tracked are of the template text; leave them out
+            self.db.execute("ALTER TABLE llm_cache ADD COLUMN template TEXT")
+            self.db.execute("UPDATE llm_cache SET embedding = NULL")
+            self.db.commit()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _variables(self, prompt: str) -> Tuple[str, str]:
+        """
+        (template name, text of its variables) for prompt, using the template whose literal
+        pieces all occur in it, in order (the longest such template wins). Prompts from
+        no known template are compared on their trailing SEMANTIC_PROMPT_CHARS.
+        """
+        text = message_text(prompt)
+        best, best_size, pieces = "", 0, None
+        for name, fragments in self._templates.items():
+            found, position = [], 0
+            for fragment in fragments:
+                start = text.find(fragment, position)
+                if start < 0:
+                    break
+                found.append(text[position:start])
+                position = start + len(fragment)
+            else:
+                size = sum(len(fragment) for fragment in fragments)
+                if size > best_size:
+                    best, best_size, pieces = name, size, found + [text[position:]]
+        if pieces is None:
+            return "", text[-SEMANTIC_PROMPT_CHARS:]
+        return best, "\n".join(piece.strip() for piece in pieces if piece.strip())[:SEMANTIC_PROMPT_CHARS]
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _semantic_matrix(self, llm_string, template):
+        # caller holds the lock
+        scope = (llm_string, template)
+        if scope not in self._vectors:
+            rows = self.db.execute(
+                "SELECT key, embedding FROM llm_cache WHERE llm_string = ? AND template = ? AND embedding IS NOT NULL",
+                (llm_string, template)).fetchall()
+            keys = [row[0] for row in rows]
+            matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows]) if rows else None
+            self._vectors[scope] = (keys, matrix)
+        return self._vectors[scope]
+
+    def _semantic_lookup(self, llm_string: str, template: str, vector: np.ndarray) -> Optional[str]:
+        # caller holds the lock
+        keys, matrix = self._semantic_matrix(llm_string, template)
+        if matrix is None:
+            return None
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= self.threshold else None
+
+    def _drop_vectors(self, llm_string):
+        for scope in [scope for scope in self._vectors if scope[0] == llm_string]:
+            del self._vectors[scope]
+
+    #
+    # BaseCache interface
+    #
+    def _touch(self, key: str):
+        # caller holds the lock
+        self.hits += 1
+        self.db.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.db.commit()
+
+    def lookup(self, prompt: str, llm_string: str):
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self.db.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._touch(key)
+            elif self.embeddings is None:
+                self.misses += 1
+                return None
+        if row is None:
+            # the embeddings call is made without the lock, so other threads' lookups are not held up by it
+            template, text = self._variables(prompt)
+            vector = self._embed(text)
+            with self._lock:
+                similar = self._semantic_lookup(llm_string, template, vector)
+                if similar is not None:
+                    row = self.db.execute("SELECT response FROM llm_cache WHERE key = ?", (similar,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self.semantic_hits += 1
+                self._touch(similar)
+        return [loads(generation) for generation in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        key = self._key(prompt, llm_string)
+        response = json.dumps([dumps(generation) for generation in return_val])
+        template, embedding = None, None
+        if self.embeddings is not None:
+            template, text = self._variables(prompt)
+            embedding = self._embed(text)
+        with span("file", "llm_cache", bytes=len(response)), self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, llm_string, response, size, last_used, embedding, template) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, llm_string, response, len(response), time.time(),
+                 embedding.tobytes() if embedding is not None else None, template))
+            self._evict()
+            self.db.commit()
+            self._drop_vectors(llm_string)
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size, llm_string in self.db.execute("SELECT key, size, llm_string FROM llm_cache ORDER BY last_used").fetchall():
+            self.db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._drop_vectors(llm_string)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self.db.execute("DELETE FROM llm_cache")
+            self.db.commit()
+            self._vectors.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        return {"hits": self.hits, "semantic_hits": self.semantic_hits, "misses": self.misses,
+                "entries": entries, "bytes": size}
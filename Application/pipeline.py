@@ -0,0 +1,149 @@
+# Standard Libraries
+import json
+import os
+import re
+import time
+from typing import Callable, Optional
+
+from helpers import (get_chain, get_field_catalog, get_research_engine, get_splunk_inventory, handle_spl_filter_agent,
+                     handle_spl_merge_agent, handle_spl_refactor_agent, handle_spl_results_agent,
+                     handle_spl_statistical_analysis_agent, handle_spl_writer_agent, handle_splunk_executor_agent,
+                     token_budget)
+import instrumentation
+from scheduler import TaskScheduler, assign_task_ids
+
+#
+# Objective pipeline
+#
+'''
+The research -> schema -> enhance_tasks -> task loop pipeline without any UI. app.py
+wraps these stages with Streamlit output and the analyst review step. batch.py runs
+run_objective() headless for many objectives at once.
+'''
+# Where gather_schema_info looks for EventCode fields
+SCHEMA_INDEX = os.getenv("SCHEMA_INDEX", "main")
+SCHEMA_SOURCETYPE = os.getenv("SCHEMA_SOURCETYPE", "*")
+
+EXECUTOR_AGENT = "splunk_executor_agent"
+
+AGENT_STATUS = {
+    "spl_writer_agent": "Writing Some SPL ...",
+    "spl_filter_agent": "Applying SPL Filters ...",
+    "spl_statistical_analysis_agent": "Applying SPL Statistical Analysis ...",
+    "spl_refactor_agent": "Refactoring SPL ...",
+}
+
+
+def objective_for(user_input: str) -> str:
+    return f"Build a Splunk SPL Query to detect {user_input} in a windows environment"
+
+
+def perform_research(user_input: str, local: bool = False) -> str:
+    # Searches, scrapes and local lookups run in parallel under RESEARCH_BUDGET seconds
+    return get_research_engine().run(user_input, local=local)
+
+
+def gather_splunk_info(on_progress: Optional[Callable] = None) -> str:
+    """Compact summary of the cached Splunk inventory (refreshed incrementally when older than INVENTORY_TTL)."""
+    return get_splunk_inventory().summary(on_progress=on_progress)
+
+
+def extract_event_codes(content: str) -> list:
+    """EventCodes named in the research, in order of first mention."""
+    items = re.findall(r"\d+", token_budget.predict(get_chain("event_id_chain"), "event_id_chain", detect_procedure=content))
+    return list(dict.fromkeys(items))
+
+
+def gather_schema_info(event_codes: list, index: str = SCHEMA_INDEX, sourcetype: str = SCHEMA_SOURCETYPE,
+                       on_progress: Optional[Callable] = None) -> dict:
+    fields = get_field_catalog().get(event_codes, index=index, sourcetype=sourcetype, on_progress=on_progress)
+    return {event_code: list(fields[event_code]) for event_code in event_codes}
+
+
+def enhance_tasks(objective, actual_content, splunk_info, schema):
+    initial_response = token_budget.predict(get_chain("start_chain"), "start_chain", objective=objective)
+    detial_response = token_budget.predict(get_chain("detial_chain"), "detial_chain", objective=objective,task_list_json=initial_response,detection_procedures=actual_content, splunk_info=splunk_info, schema=schema)
+    context_response = token_budget.predict(get_chain("tasks_context_chain"), "tasks_context_chain", objective=objective,task_list_json=detial_response, detection_procedures=actual_content)
+    # the scheduler and the task store key everything on task ids
+    return assign_task_ids(json.loads(context_response)["tasks"])
+
+
+def run_agent_task(task, spl_command, objective, research, splunk_info, schema):
+    """Run one SPL-editing task and return the new draft; other agents (e.g. analysis_agent) pass it through."""
+    chosen_agent = task["agent"]
+    if chosen_agent == "spl_writer_agent":
+        return handle_spl_writer_agent(task, objective, schema, splunk_info, research)
+    elif chosen_agent == "spl_filter_agent":
+        return handle_spl_filter_agent(task, objective, spl_command)
+    elif chosen_agent == "spl_statistical_analysis_agent":
+        return handle_spl_statistical_analysis_agent(task, objective, spl_command)
+    elif chosen_agent == "spl_refactor_agent":
+        return handle_spl_refactor_agent(task, objective, spl_command, splunk_info, schema, research)
+    return spl_command
+
+
+def execute_spl(objective, spl_command):
+    """Run spl_command (export search, capped) and summarize the results; returns (rows, summary, error)."""
+    stream = handle_splunk_executor_agent(None, spl_command)
+    rows = [row for batch in stream for row in batch]
+    return rows, handle_spl_results_agent(objective, spl_command, rows), stream.error
+
+
+def run_objective(user_input: str, local: bool = False, execute: bool = True,
+                  index: str = SCHEMA_INDEX, sourcetype: str = SCHEMA_SOURCETYPE) -> dict:
+    """
+    Run the whole pipeline for one objective without a UI (the executor task runs the SPL unreviewed).
+
+    Parameters:
+    - user_input (str): What to detect, as typed in the app.
+    - local (bool): Also search the local vector store during research.
+    - execute (bool): Run executor tasks against Splunk; otherwise they pass the SPL through.
+
+    Returns:
+    - dict: final SPL, per-task results, Splunk result summaries and per-stage timings in seconds.
+    """
+    objective = objective_for(user_input)
+    timings = {}
+
+    def timed(stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with instrumentation.stage(stage):
+                return func(*args, **kwargs)
+        finally:
+            timings[stage] = round(time.perf_counter() - start, 3)
+
+    research = timed("research", perform_research, user_input, local=local)
+    splunk_info = timed("splunk_info", gather_splunk_info)
+    event_codes = timed("event_codes", extract_event_codes, research)
+    schema = timed("schema", gather_schema_info, event_codes, index=index, sourcetype=sourcetype)
+    tasks = timed("enhance_tasks", enhance_tasks, objective, research, splunk_info, schema)
+
+    summaries = []
+
+    def run_task(task, spl_command):
+        if task["agent"] != EXECUTOR_AGENT:
+            return run_agent_task(task, spl_command, objective, research, splunk_info, schema)
+        if execute and spl_command:
+            rows, summary, error = execute_spl(objective, spl_command)
+            summaries.append({"task": task["id"], "rows": len(rows), "summary": summary, "error": error})
+        return spl_command
+
+    scheduler = TaskScheduler(run_task, is_barrier=lambda task: task["agent"] == EXECUTOR_AGENT,
+                              merge=lambda task, drafts: handle_spl_merge_agent(task, objective, drafts))
+    task_results = []
+    spl_command = ""
+    start = time.perf_counter()
+    with instrumentation.stage("tasks"):
+        for task, task_input, result, error in scheduler.run(tasks):
+            task_results.append({"id": task["id"], "agent": task["agent"], "error": str(error) if error else None})
+            spl_command = result if result is not None else task_input
+    timings["tasks"] = round(time.perf_counter() - start, 3)
+    return {
+        "objective": objective,
+        "spl": spl_command,
+        "event_codes": event_codes,
+        "tasks": task_results,
+        "summaries": summaries,
+        "timings": timings,
+    }
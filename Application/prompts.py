@@ -1,50 +1,8 @@
-
-# Standard Libraries
-import os
-import json
-import requests
-import xml.etree.ElementTree as ET
-import pandas as pd
-from collections import deque
-from typing import Dict, List
-import time
-import requests
-
-# Suppressing warnings from urllib3
-import urllib3
-urllib3.disable_warnings()
-
-# .env for environment variables
-from dotenv import load_dotenv
-
-# Imports related to LangChain
-from langchain.llms import OpenAI
-from langchain.chat_models import ChatOpenAI
-from langchain import PromptTemplate
-from langchain.chains import LLMChain, SimpleSequentialChain, SequentialChain
-from langchain.chains.summarize import load_summarize_chain
-from langchain.agents import (
-    initialize_agent, Tool, load_tools, AgentType, ZeroShotAgent, Tool, AgentExecutor
-)
-from langchain.text_splitter import RecursiveCharacterTextSplitter, CharacterTextSplitter
-from langchain.tools import BaseTool
-from langchain.schema import SystemMessage
-from langchain.prompts import MessagesPlaceholder
-from langchain.memory import ConversationSummaryBufferMemory
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.document_loaders import TextLoader
-from langchain.vectorstores import FAISS
-from langchain.chains import RetrievalQA
-
-# Other utilities and types
-from bs4 import BeautifulSoup
-from typing import Literal, Dict, Optional, Any, List, Type
-from pydantic import BaseModel, Field
-from PyPDF2 import PdfReader
-
-# Imports related to Splunk
-import splunklib.client as client
-import splunklib.results as results
+# Prompt templates only: nothing here builds a model or touches the network. Chains are
+# assembled lazily in helpers.py. Importing any langchain module still runs
+# langchain/__init__, which loads the agents and chains packages; that cost is paid once
+# per process, by whichever module imports langchain first.
+from langchain.prompts import PromptTemplate
 
 
 # Initial Tasks Creation
@@ -80,6 +38,7 @@ tasks_initializer_prompt = PromptTemplate(
     Ensure that the tasks are designed to be executed by the available agents (spl_writer_agent, spl_filter_agent, spl_statistical_analysis_agent, spl_refactor_agent, splunk_executor_agent, and analysis_agent).
 
     3. Assign a unique ID to each task for easy tracking and organization. This will help the agents to identify and refer to specific tasks in the checklist.
+    Give each task a "depends_on" list with the IDs of the earlier tasks whose SPL it builds on. Tasks that only need the same earlier SPL (for example a filter and a statistical analysis of the initial query) should depend on that task, not on each other, so they can run in parallel. The task that writes the initial SPL has an empty list.
 
     4. Organize the tasks in a logical order, with a clear starting point and end point.
     The starting point should represent the initial research or understanding necessary for the detection, while the end point should signify the completion of the objective and any finalization steps.
@@ -89,7 +48,7 @@ tasks_initializer_prompt = PromptTemplate(
 
     6. Pay close attention to the Windows Event ID, Field Names, and Data and make sure the tasks implement all necessary pieces needed to construct a valid detection.
 
-    7. Compile the tasks into a well-structured JSON format, ensuring that it is easy to read and parse by other AI agents. The JSON should only include fields such as task ID and description.
+    7. Compile the tasks into a well-structured JSON format, ensuring that it is easy to read and parse by other AI agents. The JSON should only include fields such as task ID, description, agent and depends_on.
 
     REMEMBER EACH AGENT WILL ONLY SEE A SINGLE TASK.
     ASK YOURSELF WHAT INFORMATION YOU NEED TO INCLUDE IN THE CONTEXT OF EACH TASK TO MAKE SURE THE AGENT CAN EXECUTE THE TASK WITHOUT SEEING THE OTHER TASKS OR WHAT WAS ACCOMPLISHED IN OTHER TASKS.
@@ -105,29 +64,35 @@ tasks_initializer_prompt = PromptTemplate(
                     {{
                     "id": 1,
                     "description": "Write a Splunk SPL query to detect a <insert> attack",
+                    "depends_on": [],
                     "agent": "spl_writer_agent"
                     }},
                     {{
                     "id": 2,
                     "description": "Edit the existing SPL query to filter for relevant fields such as Windows Event ID, Field Names, and Data",
+                    "depends_on": [1],
                     "agent": "spl_filter_agent"
                     }},
                     "id": 3,
                     "description": "Refactor the existing SPL query to ensure the proper index, source, and field names are used",
+                    "depends_on": [2],
                     "agent": "spl_refactor_agent"
                     }},
                     "id": 4,
                     "description": "Apply a statistical analysis of the current SPL query using SPL commands such as stats, where, or table to detect patterns indicative of a <insert> attack",
+                    "depends_on": [3],
                     "agent": "spl_statistical_analysis_agent"
                     }},
 
                     {{
                     "id": 5,
                     "description": "Run a Splunk SPL search using the developed SPL query to identify instances of a <insert> attack",
+                    "depends_on": [4],
                     "agent": "splunk_executor_agent"
                     }},
                     "id": 6,
                     "description": "Analyze the results of the Splunk search to determine if the attack has occurred",
+                    "depends_on": [5],
                     "agent": "analysis_agent"
                     }},
                     ...
@@ -514,6 +479,38 @@ spl_refactor_agent = PromptTemplate(
     """
 )
 
+# SPL Merge
+'''
+A task that depends on several tasks gets one draft from each of them;
+this folds the drafts into the single query the task continues from
+'''
+spl_merge_agent = PromptTemplate(
+    input_variables=["objective", "task", "spl_drafts"],
+    template="""
+      You are a world-class detection engineer and an expert in Splunk SPL.
+      Several agents each updated the same detection query independently, and their drafts must now be combined into one query.
+
+      For reference, your high level objective is to:
+      {objective}
+
+      The next task that will continue from the combined query is:
+      {task}
+
+      Drafts to combine, one per agent:
+      {spl_drafts}
+
+      Combine the drafts into a single valid Splunk SPL query that keeps the search terms, filters and statistical analysis of every draft.
+      Where the drafts conflict, prefer the draft that better fits the objective. Do not add anything that is not in one of the drafts.
+
+      Respond with only a plain text string containing the SPL needed to complete the task nothing else. IMPORTANT: JUST RETURN SPL QUERY, YOUR OUTPUT WILL BE ADDED DIRECTLY TO THE SEARCH BY OTHER AGENT. BE MINDFUL OF THIS
+      --- (Example SPL Response START) --- 
+      index=main sourcetype=WinEventLog EventCode=7045
+      --- (Example SPL Response END) ---
+
+      YOUR RESPONSE:
+    """
+)
+
 #fix_bad_fields
 spl_normalize_agent = PromptTemplate(
     input_variables=["existing_spl","objective", "splunk_info","schema"],
@@ -553,27 +550,39 @@ spl_normalize_agent = PromptTemplate(
 
 
 # Research Agent
-'''
-Add come background research
-'''
-research_system_template = SystemMessage(
-    content="""
-    You are a world class researcher, who can do detailed research on windows attacks and produce facts based detection procedures using only windows security event logs;
-    you do not make things up, you will try as hard as possible to gather facts & data to back up the research;
-    you will priortize searching for specific event log id, field names, and values for field names
-
-    Write a comprehensive guide to build a Splunk SPL Query including event codes and field names.
-    DO NOT build any actual SPL Query.
-
-    Please make sure you complete the objective above with the following rules:
-    1/ You should do enough research to gather as much information as possible about the objective
-    2/ If there are url of relevant links & articles, you will scrape it to gather more information
-    3/ After scraping & search, you should think "is there any new things i should search & scraping based on the data I collected to increase research quality?" If answer is yes, continue; But don't do this more than 3 iteratins
-    4/ You should not make things up, you should only write facts & data that you have gathered
-    5/ Do not make things up, you should only write facts & data that you have gathered
+research_planner_prompt = PromptTemplate(
+    input_variables=["objective", "max_queries"],
+    template="""
+    You are a world class researcher planning research on windows attacks so that a detection can be built using only windows security event logs.
+    Plan the research up front: write up to {max_queries} targeted internet search queries that together will surface the Windows Event IDs,
+    field names, and expected field values needed to detect the objective below. Make each query cover a different angle
+    (event IDs, field values, known tooling, vendor detection write-ups, MITRE ATT&CK technique pages).
+
+    Here is the detection objective:
+    {objective}
+
+    Return JSON ONLY in the following format:
+    {{"queries": ["query 1", "query 2"]}}
     """
 )
 
+research_writer_prompt = PromptTemplate(
+    input_variables=["objective", "notes"],
+    template="""
+    You are a world class researcher, who can do detailed research on windows attacks and produce facts based detection procedures using only windows security event logs;
+    you do not make things up, you only use the research notes below.
+    You will priortize specific event log id, field names, and values for field names.
+
+    Write a comprehensive guide to build a Splunk SPL Query that detects: {objective}
+    Include event codes and field names. DO NOT build any actual SPL Query.
+
+    --- (Start research notes) ---
+    {notes}
+    --- (End research notes) ---
+
+    YOUR GUIDE:
+    """
+)
 
 event_id_prompt = PromptTemplate(
     input_variables=["detect_procedure"],
@@ -600,7 +609,8 @@ summarize_splunk_results = PromptTemplate(
     The query you created was the following:
     {query}
 
-    The results of the query are:
+    The results of the query were aggregated over every returned row into the digest below
+    (row count, per-field distinct counts and top values, per-host event counts, a time histogram and a small sample of rows):
     {results}
 
     Provide a summary to your manager to describe the results of the query based on the goal provided. You do not need to provide a summary of the query, only provide a brief summary of the result and how you would recommend the security team should respond.
@@ -0,0 +1,85 @@
+# Standard Libraries
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List
+
+#
+# Rate-limit-aware LLM concurrency
+#
+'''
+Caps how many LLM calls run at once (LLM_MAX_CONCURRENCY). When any call hits an
+OpenAI rate limit, every worker pauses for the same backoff window before retrying,
+instead of each thread hammering the API on its own schedule. Calls are reentrant
+per thread: a call made from inside another call runs in the caller's slot.
+'''
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "5"))
+LLM_RATE_LIMIT_BACKOFF = float(os.getenv("LLM_RATE_LIMIT_BACKOFF", "2"))
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    # openai<1 raises openai.error.RateLimitError, openai>=1 raises openai.RateLimitError
+    return "RateLimit" in type(error).__name__ or getattr(error, "http_status", None) == 429
+
+
+class LLMRateLimiter:
+    """
+    Parameters:
+    - max_concurrency (int): Calls allowed in flight at once.
+    - retries (int): Retries after a rate-limit error before giving up.
+    - backoff (float): First backoff window in seconds; doubles on each consecutive rate limit.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, retries: int = LLM_RATE_LIMIT_RETRIES,
+                 backoff: float = LLM_RATE_LIMIT_BACKOFF):
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._resume_at = 0.0
+        self._strikes = 0
+        self.rate_limited = 0
+
+    def _wait_for_window(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Run func under the concurrency cap, retrying with a shared backoff on rate-limit errors."""
+        if getattr(self._local, "active", False):
+            return func(*args, **kwargs)
+        for attempt in range(self.retries + 1):
+            self._wait_for_window()
+            with self._semaphore:
+                self._local.active = True
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt == self.retries:
+                        raise
+                    with self._lock:
+                        self.rate_limited += 1
+                        self._strikes += 1
+                        self._resume_at = max(self._resume_at, time.monotonic() + self.backoff * 2 ** (self._strikes - 1))
+                    continue
+                finally:
+                    self._local.active = False
+            with self._lock:
+                self._strikes = 0
+            return result
+
+    def map(self, func: Callable, items: Iterable) -> List:
+        """Apply func to every item concurrently; results keep the order of items."""
+        items = list(items)
+        if len(items) <= 1:
+            return [self.call(func, item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items)), thread_name_prefix="llm") as pool:
+            # each item runs in a copy of the caller's context so trace spans land in the caller's run
+            futures = [pool.submit(contextvars.copy_context().run, self.call, func, item) for item in items]
+            return [future.result() for future in futures]
@@ -0,0 +1,157 @@
+# Standard Libraries
+import contextvars
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+#
+# Concurrent research engine
+#
+'''
+Replaces the OPENAI_FUNCTIONS research agent, which called Internet_Search,
+scrape_website and Local_Search strictly one at a time. The engine plans its
+queries with one LLM call, then runs the serper searches, browserless scrapes of
+the top result URLs and local FAISS lookups on a thread pool. Whatever has finished
+when RESEARCH_BUDGET seconds have passed is merged into one research document.
+'''
+RESEARCH_BUDGET = float(os.getenv("RESEARCH_BUDGET", "120"))
+RESEARCH_WORKERS = int(os.getenv("RESEARCH_WORKERS", "8"))
+RESEARCH_MAX_QUERIES = int(os.getenv("RESEARCH_MAX_QUERIES", "4"))
+RESEARCH_SCRAPE_PER_QUERY = int(os.getenv("RESEARCH_SCRAPE_PER_QUERY", "2"))
+# Time kept back from the budget for the final write-up call
+RESEARCH_WRITER_RESERVE = float(os.getenv("RESEARCH_WRITER_RESERVE", "30"))
+
+
+def parse_queries(text: str, max_queries: int) -> List[str]:
+    """Pull the query list out of the planner's JSON answer (tolerating prose around it)."""
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    try:
+        queries = json.loads(match.group(0))["queries"] if match else []
+    except (ValueError, KeyError, TypeError):
+        queries = []
+    return [str(query).strip() for query in queries if str(query).strip()][:max_queries]
+
+
+def top_urls(search_response: str, limit: int) -> List[str]:
+    """Organic result links from a serper response, best first."""
+    try:
+        organic = json.loads(search_response).get("organic", [])
+    except (ValueError, AttributeError):
+        return []
+    return [item["link"] for item in organic if item.get("link")][:limit]
+
+
+def search_snippets(search_response: str) -> str:
+    try:
+        organic = json.loads(search_response).get("organic", [])
+    except (ValueError, AttributeError):
+        return search_response
+    return "\n".join(f"- {item.get('title', '')}: {item.get('snippet', '')} ({item.get('link', '')})" for item in organic)
+
+
+class ResearchEngine:
+    """
+    Plans research queries up front and runs them in parallel under a wall-clock budget.
+
+    Parameters:
+    - planner_chain: LLMChain over research_planner_prompt.
+    - writer_chain: LLMChain over research_writer_prompt, or None to return the merged notes as-is.
+    - search: Callable(query) returning the serper JSON response text.
+    - scrape: Callable(objective, url) returning the (summarized) page text.
+    - local_search: Callable(query) answering from the local vector store, or None.
+    - predict: Callable(chain, name, **inputs) used for the LLM calls (e.g. TokenBudget.predict).
+    """
+
+    def __init__(self, planner_chain, writer_chain, search: Callable, scrape: Callable,
+                 local_search: Optional[Callable] = None, budget: float = RESEARCH_BUDGET,
+                 workers: int = RESEARCH_WORKERS, max_queries: int = RESEARCH_MAX_QUERIES,
+                 scrape_per_query: int = RESEARCH_SCRAPE_PER_QUERY, predict: Optional[Callable] = None):
+        self.planner_chain = planner_chain
+        self.writer_chain = writer_chain
+        self.search = search
+        self.scrape = scrape
+        self.local_search = local_search
+        self.budget = budget
+        self.workers = workers
+        self.max_queries = max_queries
+        self.scrape_per_query = scrape_per_query
+        self.predict = predict or (lambda chain, name, **inputs: chain.predict(**inputs))
+
+    def plan(self, objective: str) -> List[str]:
+        queries = parse_queries(self.predict(self.planner_chain, "research_planner_chain", objective=objective, max_queries=self.max_queries), self.max_queries)
+        return queries or [f"Windows Security event log detection procedures for {objective}"]
+
+    def gather(self, objective: str, queries: List[str], local: bool = False, deadline: Optional[float] = None) -> List[tuple]:
+        """
+        Run searches, scrapes of their top URLs and local lookups concurrently until deadline.
+
+        Returns:
+        - list: (kind, label, text) notes in a stable order (searches, then pages, then local answers).
+        """
+        deadline = deadline or time.perf_counter() + self.budget
+        notes = {}
+        scheduled_urls = set()
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="research")
+        pending = {}
+
+        def submit(func, *args):
+            # in a copy of the caller's context, so trace spans land in the caller's run
+            return pool.submit(contextvars.copy_context().run, func, *args)
+
+        try:
+            for i, query in enumerate(queries):
+                pending[submit(self.search, query)] = ("search", i, query)
+                if local and self.local_search is not None:
+                    pending[submit(self.local_search, query)] = ("local", i, query)
+            while pending:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, order, label = pending.pop(future)
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        print(f"Research {kind} failed for {label}: {e}")
+                        continue
+                    if not text:
+                        continue
+                    notes[(kind, order, label)] = text
+                    if kind == "search":
+                        for rank, url in enumerate(top_urls(text, self.scrape_per_query)):
+                            if url not in scheduled_urls:
+                                scheduled_urls.add(url)
+                                pending[submit(self.scrape, objective, url)] = ("page", order * 100 + rank, url)
+        finally:
+            # anything still running is abandoned rather than waited for
+            pool.shutdown(wait=False, cancel_futures=True)
+        kind_order = {"search": 0, "page": 1, "local": 2}
+        return [(kind, label, notes[(kind, order, label)])
+                for kind, order, label in sorted(notes, key=lambda key: (kind_order[key[0]], key[1]))]
+
+    @staticmethod
+    def merge(notes: List[tuple]) -> str:
+        sections = []
+        for kind, label, text in notes:
+            if kind == "search":
+                sections.append(f"## Search results for: {label}\n{search_snippets(text)}")
+            elif kind == "page":
+                sections.append(f"## Source: {label}\n{text}")
+            else:
+                sections.append(f"## Local knowledge for: {label}\n{text}")
+        return "\n\n".join(sections)
+
+    def run(self, objective: str, local: bool = False) -> str:
+        """Plan, gather and merge research for objective into one document."""
+        start = time.perf_counter()
+        queries = self.plan(objective)
+        reserve = RESEARCH_WRITER_RESERVE if self.writer_chain is not None else 0
+        notes = self.gather(objective, queries, local=local, deadline=start + max(self.budget - reserve, 1))
+        document = self.merge(notes)
+        if self.writer_chain is None or not notes:
+            return document
+        return self.predict(self.writer_chain, "research_writer_chain", objective=objective, notes=document)
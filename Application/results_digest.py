@@ -0,0 +1,114 @@
+# Standard Libraries
+import json
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+#
+# Local pre-aggregation of Splunk results
+#
+'''
+handle_spl_results_agent used to paste every result row into the summary prompt. The
+digest below is computed locally over all rows and is bounded by the DIGEST_* limits,
+so the prompt stays the same size however many rows the search returned.
+'''
+DIGEST_MAX_FIELDS = int(os.getenv("DIGEST_MAX_FIELDS", "25"))
+DIGEST_TOP_N = int(os.getenv("DIGEST_TOP_N", "5"))
+DIGEST_MAX_HOSTS = int(os.getenv("DIGEST_MAX_HOSTS", "20"))
+DIGEST_TIME_BINS = int(os.getenv("DIGEST_TIME_BINS", "12"))
+DIGEST_SAMPLE_ROWS = int(os.getenv("DIGEST_SAMPLE_ROWS", "5"))
+DIGEST_VALUE_CHARS = int(os.getenv("DIGEST_VALUE_CHARS", "80"))
+
+# Splunk internals that say nothing about the detection
+SKIPPED_FIELDS = {"_raw", "_bkt", "_cd", "_si", "_serial", "_indextime", "_sourcetype", "_eventtype_color",
+                  "linecount", "splunk_server", "splunk_server_group", "punct", "timestartpos", "timeendpos"}
+
+
+def _clip(value, limit=DIGEST_VALUE_CHARS) -> str:
+    text = str(value)
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def results_frame(rows: List[dict]) -> pd.DataFrame:
+    """Columnar frame of Splunk result rows; multivalue fields are joined so they can be counted."""
+    frame = pd.DataFrame.from_records(rows)
+    for column in frame.columns:
+        if frame[column].map(lambda value: isinstance(value, list)).any():
+            frame[column] = frame[column].map(lambda value: " | ".join(map(str, value)) if isinstance(value, list) else value)
+    return frame.drop(columns=[c for c in frame.columns if c in SKIPPED_FIELDS], errors="ignore")
+
+
+def field_profile(frame: pd.DataFrame, top_n: int = DIGEST_TOP_N, max_fields: int = DIGEST_MAX_FIELDS) -> List[dict]:
+    """Cardinality and top values for the most populated fields."""
+    columns = [c for c in frame.columns if c != "_time"]
+    populated = frame[columns].notna().sum().sort_values(ascending=False)
+    profile = []
+    for column in populated.index[:max_fields]:
+        values = frame[column].dropna().astype(str)
+        counts = values.value_counts().head(top_n)
+        profile.append({
+            "field": column,
+            "present": int(populated[column]),
+            "distinct": int(values.nunique()),
+            "top": [[_clip(value), int(count)] for value, count in counts.items()],
+        })
+    return profile
+
+
+def host_counts(frame: pd.DataFrame, max_hosts: int = DIGEST_MAX_HOSTS) -> dict:
+    if "host" not in frame.columns:
+        return {}
+    counts = frame["host"].dropna().astype(str).value_counts()
+    return {"distinct_hosts": int(counts.size), "top_hosts": [[_clip(h), int(c)] for h, c in counts.head(max_hosts).items()]}
+
+
+def time_histogram(frame: pd.DataFrame, bins: int = DIGEST_TIME_BINS) -> dict:
+    if "_time" not in frame.columns:
+        return {}
+    times = pd.to_datetime(frame["_time"], utc=True, errors="coerce").dropna()
+    if times.empty:
+        return {}
+    # Divide by a Timedelta rather than reading int64 storage: pandas 3 keeps parsed times in
+    # microseconds (pandas 2 in nanoseconds), so the raw integers have no fixed unit
+    seconds = ((times - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)).to_numpy()
+    counts, edges = np.histogram(seconds, bins=bins if seconds.max() > seconds.min() else 1)
+    return {
+        "earliest": times.min().isoformat(),
+        "latest": times.max().isoformat(),
+        "buckets": [[pd.Timestamp(edge, unit="s", tz="UTC").isoformat(), int(count)] for edge, count in zip(edges[:-1], counts)],
+    }
+
+
+def sample_rows(frame: pd.DataFrame, size: int = DIGEST_SAMPLE_ROWS, max_fields: int = DIGEST_MAX_FIELDS) -> List[dict]:
+    if frame.empty:
+        return []
+    sample = frame.sample(n=min(size, len(frame)), random_state=0) if len(frame) > size else frame
+    columns = list(frame.columns[:max_fields])
+    return [{k: _clip(v) for k, v in row.items() if pd.notna(v)} for row in sample[columns].to_dict("records")]
+
+
+def build_results_digest(rows: List[dict]) -> str:
+    """
+    Bounded JSON digest of Splunk result rows for the LLM.
+
+    Parameters:
+    - rows (list): Result rows (dicts) from Splunk.
+
+    Returns:
+    - str: JSON with the row count, per-field cardinality and top values, per-host counts,
+      a time histogram and a small sample of rows.
+    """
+    rows = [row for row in rows if isinstance(row, dict)]
+    if not rows:
+        return json.dumps({"rows": 0})
+    frame = results_frame(rows)
+    digest = {
+        "rows": len(frame),
+        "fields": field_profile(frame),
+        "hosts": host_counts(frame),
+        "time": time_histogram(frame),
+        "sample": sample_rows(frame),
+    }
+    return json.dumps(digest, indent=1)
@@ -0,0 +1,219 @@
+# Standard Libraries
+import contextvars
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional
+
+#
+# Task DAG scheduler
+#
+'''
+The task loop used to run task_list_json[0] until the list was empty, so writer,
+filter, statistical-analysis and refactor tasks ran strictly one after another.
+Tasks may now declare "depends_on" (ids of earlier tasks). A task without the field
+depends on the task before it, so old plans run exactly as before. Every task whose
+dependencies are finished is submitted to a thread pool.
+
+A task's input SPL is built only from the results of its dependencies, in id order.
+Completion order therefore never changes what a task sees, and the run is
+deterministic. A failed dependency passes its own input through, but only when no
+other dependency succeeded. When several distinct drafts remain, the scheduler's merge
+callable (an LLM merge in the pipeline) folds them into one query. Barrier tasks (the
+executor, which waits for analyst review) run inline on the caller's thread once
+nothing else is in flight.
+'''
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "4"))
+
+
+def assign_task_ids(tasks: List[dict]) -> List[dict]:
+    """
+    Give every task a unique "id", in place. Planner output that omits an id, or repeats
+    one, gets the next unused integer. Returns tasks.
+    """
+    seen = set()
+    next_id = 1 + max((task["id"] for task in tasks if isinstance(task.get("id"), int)), default=0)
+    for task in tasks:
+        task_id = task.get("id")
+        if task_id is None or str(task_id) in seen:
+            task["id"] = task_id = next_id
+            next_id += 1
+        seen.add(str(task_id))
+    return tasks
+
+
+def normalize_dependencies(tasks: List[dict]) -> Dict[object, List[object]]:
+    """
+    Map each task id to the ids it depends on.
+
+    Only earlier tasks in plan order are valid dependencies, which keeps the graph acyclic.
+    A task without a valid "depends_on" list depends on the task before it. Raises
+    ValueError when a task has no id or shares one (see assign_task_ids).
+    """
+    dependencies = {}
+    seen = []
+    for position, task in enumerate(tasks):
+        if task.get("id") is None:
+            raise ValueError(f"Task at position {position} has no id")
+        if task["id"] in dependencies:
+            raise ValueError(f"Task id {task['id']!r} is used more than once")
+        declared = task.get("depends_on")
+        if isinstance(declared, list):
+            earlier = {str(task_id): task_id for task_id in seen}
+            valid = list(dict.fromkeys(earlier[str(d)] for d in declared if str(d) in earlier))
+            if valid or not declared:
+                dependencies[task["id"]] = valid
+                seen.append(task["id"])
+                continue
+        dependencies[task["id"]] = seen[-1:]
+        seen.append(task["id"])
+    return dependencies
+
+
+def unique_drafts(drafts: List[tuple]) -> List[tuple]:
+    """Non-empty drafts with duplicates removed, keeping the first (task id, spl) pair of each."""
+    unique = []
+    for task_id, spl in drafts:
+        if spl and spl not in [existing for _, existing in unique]:
+            unique.append((task_id, spl))
+    return unique
+
+
+def merge_drafts(drafts: List[tuple]) -> str:
+    """
+    Concatenate the SPL drafts of several dependencies, each under a "Draft from task N:"
+    header. The result is prompt text, not runnable SPL.
+
+    Parameters:
+    - drafts (list): (task id, spl) pairs of the dependencies, in plan order.
+    """
+    unique = unique_drafts(drafts)
+    if len(unique) <= 1:
+        return unique[0][1] if unique else ""
+    return "\n\n".join(f"Draft from task {task_id}:\n{spl}" for task_id, spl in unique)
+
+
+class TaskScheduler:
+    """
+    Parameters:
+    - run_task: Callable(task, spl_command) returning the task's new SPL draft.
+    - is_barrier: Callable(task) -> bool for tasks that must run alone on the caller's thread.
+    - workers (int): Size of the worker pool.
+    - initializer: Optional callable run once in every worker thread (e.g. to attach the UI context).
+    - merge: Callable(task, drafts) returning one SPL query from the distinct drafts
+      [(task id, spl), ...] of a task's dependencies. Defaults to merge_drafts, which
+      only concatenates them.
+    """
+
+    def __init__(self, run_task: Callable, is_barrier: Callable = lambda task: False,
+                 workers: int = TASK_WORKERS, initializer: Optional[Callable] = None,
+                 merge: Optional[Callable] = None):
+        self.run_task = run_task
+        self.is_barrier = is_barrier
+        self.workers = workers
+        self.initializer = initializer
+        self.merge = merge or (lambda task, drafts: merge_drafts(drafts))
+
+    def input_for(self, task: dict, dependencies: dict, finished: dict, results: dict) -> str:
+        """
+        The input SPL of task. Failed dependencies (finished as None) contribute only when
+        every dependency failed; several distinct drafts go through merge.
+        """
+        deps = dependencies[task["id"]]
+        succeeded = [d for d in deps if finished.get(d) is not None]
+        drafts = unique_drafts([(d, results.get(d, "")) for d in succeeded or deps])
+        if len(drafts) <= 1:
+            return drafts[0][1] if drafts else ""
+        return self.merge(task, drafts)
+
+    def resolve(self, tasks: List[dict], dependencies: dict, finished: dict) -> dict:
+        """
+        Results of finished tasks, in plan order. A failed task (result None) passes its
+        input through, so its dependents continue from the last good draft.
+        """
+        results = {}
+        for task in tasks:
+            task_id = task["id"]
+            if task_id not in finished:
+                continue
+            result = finished[task_id]
+            if result is None:
+                result = self.input_for(task, dependencies, finished, results)
+            results[task_id] = result
+        return results
+
+    def run(self, tasks: List[dict], finished: Optional[dict] = None,
+            on_start: Optional[Callable] = None) -> Iterator[tuple]:
+        """
+        Run every unfinished task once its dependencies are finished.
+
+        Parameters:
+        - tasks (list): The whole plan, in order.
+        - finished (dict): {task id: result SPL, or None if it failed} from an earlier run.
+        - on_start: Callable(task, spl_command) called on the caller's thread before a task starts.
+
+        Yields:
+        - tuple: (task, spl_command, result, error) as tasks finish; result is None when error is set.
+        """
+        dependencies = normalize_dependencies(tasks)
+        finished = dict(finished or {})
+        results = self.resolve(tasks, dependencies, finished)
+        started = set(finished)
+        in_flight = {}
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="task",
+                                  initializer=self.initializer)
+
+        def prepare(task):
+            # the merge may call the LLM; if it fails, the task fails without running
+            started.add(task["id"])
+            try:
+                return self.input_for(task, dependencies, finished, results), None
+            except Exception as e:
+                return "", e
+
+        def record(task, spl_command, result, error):
+            finished[task["id"]] = None if error else result
+            results[task["id"]] = spl_command if error else result
+
+        try:
+            while len(started) < len(tasks) or in_flight:
+                ready = [task for task in tasks if task["id"] not in started
+                         and all(d in finished for d in dependencies[task["id"]])]
+                barrier = next((task for task in ready if self.is_barrier(task)), None)
+                for task in ready:
+                    if self.is_barrier(task):
+                        continue
+                    spl_command, error = prepare(task)
+                    if error:
+                        record(task, spl_command, None, error)
+                        yield task, spl_command, None, error
+                        continue
+                    if on_start:
+                        on_start(task, spl_command)
+                    in_flight[pool.submit(contextvars.copy_context().run, self.run_task, task, spl_command)] = (task, spl_command)
+                if not in_flight:
+                    if barrier is None:
+                        break
+                    spl_command, error = prepare(barrier)
+                    result = None
+                    if not error:
+                        if on_start:
+                            on_start(barrier, spl_command)
+                        try:
+                            result = self.run_task(barrier, spl_command)
+                        except Exception as e:
+                            error = e
+                    record(barrier, spl_command, result, error)
+                    yield barrier, spl_command, result, error
+                    continue
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                # report finished tasks in plan order, not completion order
+                for future in sorted(done, key=lambda f: tasks.index(in_flight[f][0])):
+                    task, spl_command = in_flight.pop(future)
+                    try:
+                        result, error = future.result(), None
+                    except Exception as e:
+                        result, error = None, e
+                    record(task, spl_command, result, error)
+                    yield task, spl_command, result, error
+        finally:
+            pool.shutdown(wait=True)
@@ -0,0 +1,106 @@
+# Standard Libraries
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+#
+# Relevance-pruned schema
+#
+'''
+fieldsummary returns hundreds of fields per EventCode, and all of them used to be
+pasted into spl_writer_chain and spl_normalize_chain. FieldIndex ranks the fields of
+each code against the task description and research text and keeps the top
+SCHEMA_TOP_K. Ranking is lexical (exact field-name mentions plus overlap of the
+words in the field name), optionally blended with embedding similarity.
+'''
+SCHEMA_TOP_K = int(os.getenv("SCHEMA_TOP_K", "25"))
+SCHEMA_EMBEDDING_WEIGHT = float(os.getenv("SCHEMA_EMBEDDING_WEIGHT", "0.5"))
+SCHEMA_INDEX_EMBEDDINGS = os.getenv("SCHEMA_INDEX_EMBEDDINGS", "False").lower() in ("1", "true", "yes")
+
+# Always kept when present: every detection needs them to scope and group events
+CORE_FIELDS = ["EventCode", "host", "source", "sourcetype", "index", "_time", "ComputerName"]
+
+TASK_WEIGHT = 2.0
+RESEARCH_WEIGHT = 1.0
+MENTION_BONUS = 3.0
+
+
+def split_terms(text: str) -> List[str]:
+    """Words of a field name or free text: splits camelCase, snake_case, dots and punctuation."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    return [term for term in re.split(r"[^A-Za-z0-9]+", text.lower()) if len(term) > 1]
+
+
+class FieldIndex:
+    """
+    Parameters:
+    - embeddings: Optional LangChain Embeddings for the similarity tier.
+    - top_k (int): Fields kept per EventCode (core fields included).
+    - embedding_weight (float): Weight of cosine similarity relative to the lexical score.
+    """
+
+    def __init__(self, embeddings=None, top_k: int = SCHEMA_TOP_K, embedding_weight: float = SCHEMA_EMBEDDING_WEIGHT):
+        self.embeddings = embeddings
+        self.top_k = top_k
+        self.embedding_weight = embedding_weight
+
+    def _lexical_scores(self, fields: List[str], task_text: str, research_text: str) -> np.ndarray:
+        task_terms = Counter(split_terms(task_text))
+        research_terms = Counter(split_terms(research_text))
+        lowered = f"{task_text}\n{research_text}".lower()
+        scores = np.zeros(len(fields), dtype=np.float32)
+        for i, field in enumerate(fields):
+            terms = split_terms(field)
+            if not terms:
+                continue
+            overlap = sum(TASK_WEIGHT * min(task_terms[t], 3) + RESEARCH_WEIGHT * min(research_terms[t], 3) for t in terms)
+            scores[i] = overlap / len(terms)
+            if re.search(rf"(?<![A-Za-z0-9_]){re.escape(field.lower())}(?![A-Za-z0-9_])", lowered):
+                scores[i] += MENTION_BONUS
+        return scores
+
+    def _embedding_scores(self, fields: List[str], query_text: str) -> np.ndarray:
+        names = [" ".join(split_terms(field)) or field for field in fields]
+        vectors = np.asarray(self.embeddings.embed_documents(names), dtype=np.float32)
+        query = np.asarray(self.embeddings.embed_query(query_text[:8000]), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-9
+        query /= np.linalg.norm(query) + 1e-9
+        return vectors @ query
+
+    def rank(self, fields: List[str], task_text: str, research_text: str = "") -> List[str]:
+        """Fields ordered from most to least relevant (ties keep their original order)."""
+        if not fields:
+            return []
+        scores = self._lexical_scores(fields, task_text, research_text)
+        if self.embeddings is not None:
+            scores = scores + self.embedding_weight * MENTION_BONUS * self._embedding_scores(fields, task_text)
+        order = sorted(range(len(fields)), key=lambda i: (-scores[i], i))
+        return [fields[i] for i in order]
+
+    def prune(self, schema: Dict[str, list], task_text: str, research_text: str = "",
+              top_k: Optional[int] = None) -> Dict[str, list]:
+        """
+        Keep the top_k most relevant fields of every EventCode.
+
+        Parameters:
+        - schema (dict): {event_code: [field names]} as built by gather_schema_info.
+        - task_text (str): Task description and context.
+        - research_text (str): Research document for the objective.
+
+        Returns:
+        - dict: {event_code: [field names]} with core fields first.
+        """
+        top_k = top_k or self.top_k
+        pruned = {}
+        for code, fields in (schema or {}).items():
+            fields = list(fields)
+            if len(fields) <= top_k:
+                pruned[code] = fields
+                continue
+            core = [field for field in CORE_FIELDS if field in fields]
+            ranked = [field for field in self.rank(fields, task_text, research_text) if field not in core]
+            pruned[code] = core + ranked[:max(top_k - len(core), 0)]
+        return pruned
@@ -0,0 +1,223 @@
+# Standard Libraries
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+# Imports related to Splunk
+import splunklib.client as client
+import splunklib.results as results
+
+from instrumentation import span
+from splunk_session import SPLUNK_ERRORS
+
+#
+# Splunk search results and the asynchronous job manager
+#
+SPLUNK_MAX_CONCURRENT_JOBS = int(os.getenv("SPLUNK_MAX_CONCURRENT_JOBS", "4"))
+SPLUNK_JOB_TIMEOUT = float(os.getenv("SPLUNK_JOB_TIMEOUT", "300"))
+SPLUNK_POLL_INITIAL = float(os.getenv("SPLUNK_POLL_INITIAL", "0.5"))
+SPLUNK_POLL_MAX = float(os.getenv("SPLUNK_POLL_MAX", "5"))
+# Backoff while waiting for one of the process-wide job slots
+SLOT_POLL_INITIAL = 0.01
+SLOT_POLL_MAX = 0.25
+
+PROGRESS_FIELDS = ("dispatchState", "doneProgress", "scanCount", "eventCount", "resultCount", "runDuration")
+
+
+class SplunkSearchResult:
+    """
+    Rows returned by a Splunk search plus what the search cost.
+
+    Iterating the result yields the result rows (dicts), so callers that treated the
+    return value as a list of rows keep working.
+    """
+
+    def __init__(self, query, mode, rows=None, sid=None, run_duration=None, messages=None, error=None, stats=None):
+        self.query = query
+        self.mode = mode
+        self.rows = rows or []
+        self.sid = sid
+        self.run_duration = run_duration
+        self.messages = messages or []
+        self.error = error
+        self.stats = stats or {}
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def bytes(self) -> int:
+        """Size of the result rows as JSON (what was read from Splunk, give or take the envelope)."""
+        return sum(len(json.dumps(row)) for row in self.rows)
+
+    def cost(self) -> dict:
+        return {"mode": self.mode, "sid": self.sid, "run_duration": self.run_duration, "rows": len(self.rows),
+                "bytes": self.bytes, **self.stats}
+
+
+def read_json_results(stream, rows, messages):
+    """Append the final result rows of a JSON results stream to rows and its messages to messages."""
+    reader = results.JSONResultsReader(stream)
+    for item in reader:
+        if isinstance(item, results.Message):
+            messages.append(f"{item.type}: {item.message}")
+        elif isinstance(item, dict) and not reader.is_preview:
+            rows.append(item)
+
+
+def normalize_query(search_query: str) -> str:
+    search_query = search_query.strip()
+    if not search_query.lower().startswith("search") and not search_query.startswith("|"):
+        search_query = "search " + search_query
+    return search_query
+
+
+def _job_progress(job) -> dict:
+    content = job.content
+    progress = {}
+    for field in PROGRESS_FIELDS:
+        value = content.get(field)
+        if value is None:
+            continue
+        try:
+            progress[field] = float(value) if field in ("doneProgress", "runDuration") else int(float(value))
+        except ValueError:
+            progress[field] = value
+    progress["isDone"] = content.get("isDone") == "1"
+    progress["isFailed"] = content.get("isFailed") == "1"
+    return progress
+
+
+class SplunkJobManager:
+    """
+    Runs Splunk searches as asynchronous jobs on top of a SplunkSessionPool.
+
+    Several searches are submitted at once (up to max_concurrency across every caller
+    and thread using the manager), polled with
+    exponential backoff and cancelled on the server if they pass their deadline.
+    on_progress(index, query, progress) is called after every poll with
+    dispatchState, doneProgress, scanCount, eventCount and resultCount.
+
+    Parameters:
+    - pool (SplunkSessionPool): Source of authenticated services.
+    - max_concurrency (int): Searches allowed to run on the server at the same time.
+    - timeout (float): Default per-search deadline in seconds.
+    """
+
+    def __init__(self, pool, max_concurrency=SPLUNK_MAX_CONCURRENT_JOBS, timeout=SPLUNK_JOB_TIMEOUT,
+                 poll_initial=SPLUNK_POLL_INITIAL, poll_max=SPLUNK_POLL_MAX):
+        self.pool = pool
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        # process-wide cap; the asyncio semaphores below only bound one run_many call
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    #
+    # Blocking calls, each run in a worker thread with a borrowed session
+    #
+    def _create(self, query, kwargs_search) -> str:
+        with self.pool.session() as service:
+            return service.jobs.create(query, exec_mode="normal", **kwargs_search).sid
+
+    def _refresh(self, sid) -> dict:
+        with self.pool.session() as service:
+            return _job_progress(client.Job(service, sid).refresh())
+
+    def _fetch(self, sid, rows, messages):
+        with self.pool.session() as service:
+            read_json_results(client.Job(service, sid).results(output_mode="json", count=0), rows, messages)
+
+    def _cancel(self, sid):
+        try:
+            with self.pool.session() as service:
+                client.Job(service, sid).cancel()
+        except SPLUNK_ERRORS:
+            # the job may already have been reaped by the server; otherwise Splunk expires it on its own
+            pass
+
+    #
+    # Async API
+    #
+    async def run(self, query: str, index: int = 0, timeout: Optional[float] = None,
+                  on_progress: Optional[Callable] = None, semaphore: Optional[asyncio.Semaphore] = None,
+                  earliest_time: str = "-7d", latest_time: str = "now") -> SplunkSearchResult:
+        """Submit one search, wait for it (within timeout) and return its rows. The job is always deleted afterwards."""
+        query = normalize_query(query)
+        with span("splunk", "job", query=query) as trace_span:
+            result = await self._run(query, index, timeout, on_progress, semaphore, earliest_time, latest_time)
+            trace_span.set(error=result.error, **result.cost())
+            return result
+
+    async def _acquire_slot(self):
+        # Polled instead of blocking a worker thread in acquire(): a task cancelled while
+        # waiting then never ends up owning a slot that nobody releases
+        delay = SLOT_POLL_INITIAL
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, SLOT_POLL_MAX)
+
+    async def _run(self, query, index, timeout, on_progress, semaphore, earliest_time, latest_time) -> SplunkSearchResult:
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrency)
+        timeout = self.timeout if timeout is None else timeout
+        kwargs_search = {"earliest_time": earliest_time, "latest_time": latest_time}
+        rows, messages = [], []
+        sid, progress = None, {}
+        async with semaphore:
+            await self._acquire_slot()
+            start = time.perf_counter()
+            deadline = start + timeout
+            try:
+                sid = await asyncio.to_thread(self._create, query, kwargs_search)
+                delay = self.poll_initial
+                while True:
+                    progress = await asyncio.to_thread(self._refresh, sid)
+                    if on_progress:
+                        on_progress(index, query, progress)
+                    if progress["isDone"] or progress["isFailed"]:
+                        break
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        return SplunkSearchResult(query, "job", sid=sid, run_duration=time.perf_counter() - start,
+                                                  error=f"Search exceeded its {timeout:g}s deadline and was cancelled",
+                                                  stats=progress)
+                    # the last sleep is cut short so the final poll lands on the deadline
+                    await asyncio.sleep(min(delay, remaining))
+                    delay = min(delay * 2, self.poll_max)
+                if progress["isFailed"]:
+                    return SplunkSearchResult(query, "job", sid=sid, run_duration=progress.get("runDuration"),
+                                              error="Search failed on the server", stats=progress)
+                await asyncio.to_thread(self._fetch, sid, rows, messages)
+                return SplunkSearchResult(query, "job", rows, sid, progress.get("runDuration"), messages, stats=progress)
+            except SPLUNK_ERRORS as e:
+                # one search's failure must not escape run_many's gather and abort the others
+                return SplunkSearchResult(query, "job", sid=sid, run_duration=time.perf_counter() - start,
+                                          error=str(e), stats=progress)
+            finally:
+                if sid:
+                    await asyncio.to_thread(self._cancel, sid)
+                self._slots.release()
+
+    async def run_many(self, queries: List[str], timeout: Optional[float] = None,
+                       on_progress: Optional[Callable] = None, max_concurrency: Optional[int] = None,
+                       **kwargs) -> List[SplunkSearchResult]:
+        """Run several searches concurrently (at most max_concurrency at a time); results come back in the order of queries."""
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+        return await asyncio.gather(*[
+            self.run(query, index=i, timeout=timeout, on_progress=on_progress, semaphore=semaphore, **kwargs)
+            for i, query in enumerate(queries)
+        ])
+
+    def run_all(self, queries: List[str], timeout: Optional[float] = None,
+                on_progress: Optional[Callable] = None, max_concurrency: Optional[int] = None,
+                **kwargs) -> List[SplunkSearchResult]:
+        """Synchronous entry point for run_many (for Streamlit and other non-async callers)."""
+        return asyncio.run(self.run_many(queries, timeout=timeout, on_progress=on_progress,
+                                         max_concurrency=max_concurrency, **kwargs))
@@ -0,0 +1,196 @@
+# Standard Libraries
+import io
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+# Imports related to Splunk
+import splunklib.client as client
+from splunklib.binding import HTTPError
+
+#
+# Pooled Splunk sessions
+#
+'''
+Every search used to call client.connect(), which opened a new TLS connection and
+logged in again. SplunkSessionPool keeps a fixed number of splunklib Service objects
+that share one session token and one keep-alive requests.Session. The token is
+refreshed once SPLUNK_SESSION_TTL has passed, and splunklib's autologin covers a
+token that the server expired early.
+'''
+SPLUNK_PORT = int(os.getenv("SPLUNK_PORT", "8089"))
+SPLUNK_SCHEME = os.getenv("SPLUNK_SCHEME", "https")
+SPLUNK_VERIFY = os.getenv("SPLUNK_VERIFY", "False").lower() in ("1", "true", "yes")
+SPLUNK_POOL_SIZE = int(os.getenv("SPLUNK_POOL_SIZE", "4"))
+SPLUNK_TIMEOUT = float(os.getenv("SPLUNK_TIMEOUT", "60"))
+# Read timeout of the export endpoint, which sends nothing until a transforming search has
+# finished; 0 means no read timeout. Connecting still uses SPLUNK_TIMEOUT.
+SPLUNK_EXPORT_TIMEOUT = float(os.getenv("SPLUNK_EXPORT_TIMEOUT", "1800")) or None
+SPLUNK_POOL_TIMEOUT = float(os.getenv("SPLUNK_POOL_TIMEOUT", "30"))
+SPLUNK_SESSION_TTL = float(os.getenv("SPLUNK_SESSION_TTL", "3000"))
+
+
+class _StreamBody(io.RawIOBase):
+    """
+    File-like body handed to splunklib; closing it returns the connection to the keep-alive pool.
+    A RawIOBase, because JSONResultsReader wraps the body in an io.BufferedReader.
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self._response.raw.decode_content = True
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._response.raw.read(None if size is None or size < 0 else size)
+
+    def readinto(self, buffer):
+        data = self._response.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._response.close()
+        super().close()
+
+
+def keepalive_handler(session: requests.Session, timeout: float = SPLUNK_TIMEOUT, verify: bool = SPLUNK_VERIFY,
+                      export_timeout: float = SPLUNK_EXPORT_TIMEOUT):
+    """Build a splunklib HTTP handler that sends every request through a pooled requests.Session."""
+
+    def request(url, message, **kwargs):
+        read_timeout = export_timeout if urlsplit(url).path.rstrip("/").endswith("/jobs/export") else timeout
+        response = session.request(
+            message.get("method", "GET"),
+            url,
+            headers=dict(message.get("headers", [])),
+            data=message.get("body", ""),
+            stream=True,
+            timeout=(timeout, read_timeout),
+            verify=verify,
+        )
+        return {
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": list(response.headers.items()),
+            "body": _StreamBody(response),
+        }
+
+    return request
+
+
+class SplunkPoolTimeout(Exception):
+    """Raised when every pooled Splunk session stays checked out for longer than pool_timeout."""
+
+
+# What a Splunk request can fail with: an error status, no free session, or a transport
+# failure (requests while sending, urllib3 while a streamed body is read). Searches
+# report these as their error instead of raising.
+SPLUNK_ERRORS = (HTTPError, SplunkPoolTimeout, requests.RequestException, urllib3.exceptions.HTTPError)
+
+
+class SplunkSessionPool:
+    """
+    Thread-safe pool of authenticated splunklib Service objects.
+
+    Parameters:
+    - host (str): Splunk management host.
+    - username (str), password (str): Credentials used to obtain the session token.
+    - size (int): Maximum number of Service objects (and keep-alive connections).
+    - timeout (float): HTTP timeout for each request, in seconds.
+    - export_timeout (float): Read timeout of export requests (None: wait as long as the search runs).
+    - pool_timeout (float): How long session() waits for a free Service before raising SplunkPoolTimeout.
+    - session_ttl (float): Seconds after which the shared token is refreshed proactively.
+    """
+
+    def __init__(self, host, username, password, port=SPLUNK_PORT, scheme=SPLUNK_SCHEME, size=SPLUNK_POOL_SIZE,
+                 timeout=SPLUNK_TIMEOUT, pool_timeout=SPLUNK_POOL_TIMEOUT, session_ttl=SPLUNK_SESSION_TTL,
+                 verify=SPLUNK_VERIFY, export_timeout=SPLUNK_EXPORT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.scheme = scheme
+        self.username = username
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.pool_timeout = pool_timeout
+        self.session_ttl = session_ttl
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        self.handler = keepalive_handler(self.http, timeout=timeout, verify=verify, export_timeout=export_timeout)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._token = None
+        self._token_time = 0.0
+
+    def _new_service(self):
+        return client.Service(
+            handler=self.handler,
+            host=self.host,
+            port=self.port,
+            scheme=self.scheme,
+            username=self.username,
+            password=self.password,
+            autologin=True,
+        )
+
+    def _refresh_token(self, service):
+        with self._lock:
+            if self._token is None or time.time() - self._token_time > self.session_ttl:
+                service.login()
+                self._token = service.token
+                self._token_time = time.time()
+        service.token = self._token
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._new_service()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.pool_timeout)
+        except queue.Empty:
+            raise SplunkPoolTimeout(f"All {self.size} Splunk sessions stayed busy for {self.pool_timeout:g}s; "
+                                    f"raise SPLUNK_POOL_SIZE or SPLUNK_POOL_TIMEOUT") from None
+
+    @contextmanager
+    def session(self):
+        """Borrow an authenticated Service for the duration of a with-block."""
+        service = self._checkout()
+        try:
+            if service.token != self._token or time.time() - self._token_time > self.session_ttl:
+                self._refresh_token(service)
+            yield service
+        finally:
+            # autologin may have replaced an expired token while the service was out
+            if isinstance(service.token, str) and service.token != self._token:
+                with self._lock:
+                    self._token = service.token
+                    self._token_time = time.time()
+            self._idle.put(service)
+
+    def close(self):
+        self.http.close()
@@ -0,0 +1,121 @@
+# Standard Libraries
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from instrumentation import span
+
+#
+# Session-scoped state store
+#
+'''
+Replaces the single state.json, which every analyst on the server shared and which
+was rewritten in full on every flag change. State is keyed by
+"<session id>:<objective hash>". The working copies of the most recently used keys
+are kept in memory. save() writes a state to SQLite as one atomic upsert, and only when
+it changed since the last write. Expired states are pruned at most once per
+STATE_PRUNE_INTERVAL.
+'''
+STATE_STORE_PATH = os.getenv("STATE_STORE_PATH", os.path.join(os.getcwd(), "state_store.db"))
+# States untouched for this long are dropped by prune()
+STATE_TTL = float(os.getenv("STATE_TTL", str(7 * 24 * 3600)))
+STATE_PRUNE_INTERVAL = float(os.getenv("STATE_PRUNE_INTERVAL", "3600"))
+# In-memory working copies kept; the least recently used are evicted (they stay in SQLite)
+STATE_HOT_ENTRIES = int(os.getenv("STATE_HOT_ENTRIES", "256"))
+
+
+def state_key(session_id: str, objective: str) -> str:
+    """Key for one analyst session working on one objective."""
+    digest = hashlib.sha1(objective.strip().lower().encode("utf-8")).hexdigest()[:16]
+    return f"{session_id}:{digest}"
+
+
+class StateStore:
+    """
+    Parameters:
+    - path (str): SQLite file the states are persisted to.
+    - defaults (dict): State returned for keys seen for the first time.
+    - max_hot (int): Working copies kept in memory.
+    - ttl (float): Seconds a state may go unsaved before it is pruned.
+    - prune_interval (float): Minimum seconds between automatic prunes.
+    """
+
+    def __init__(self, path: str = STATE_STORE_PATH, defaults: Optional[dict] = None, max_hot: int = STATE_HOT_ENTRIES,
+                 ttl: float = STATE_TTL, prune_interval: float = STATE_PRUNE_INTERVAL):
+        self.defaults = defaults or {}
+        self.max_hot = max_hot
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._hot = OrderedDict()
+        self._written = {}
+        self._pruned = 0.0
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS states (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+        """)
+
+    def _remember(self, key, state):
+        # caller holds the lock
+        self._hot[key] = state
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.max_hot:
+            evicted, _ = self._hot.popitem(last=False)
+            self._written.pop(evicted, None)
+
+    def load(self, key: str) -> dict:
+        """The state for key: the in-memory copy, else the persisted one, else a copy of the defaults."""
+        if time.time() - self._pruned > self.prune_interval:
+            self.prune()
+        with self._lock:
+            state = self._hot.get(key)
+            if state is None:
+                row = self.db.execute("SELECT value FROM states WHERE key = ?", (key,)).fetchone()
+                state = copy.deepcopy(self.defaults)
+                if row:
+                    state.update(json.loads(row[0]))
+                    self._written[key] = row[0]
+            self._remember(key, state)
+            return state
+
+    def save(self, key: str, state: dict):
+        """Make state the current state for key and persist it if it changed."""
+        value = json.dumps(state, sort_keys=True)
+        with self._lock:
+            self._remember(key, state)
+            if self._written.get(key) == value:
+                return
+            with span("file", "state_store", bytes=len(value)):
+                self.db.execute("INSERT OR REPLACE INTO states (key, value, updated) VALUES (?, ?, ?)",
+                                (key, value, time.time()))
+            self._written[key] = value
+
+    def delete(self, key: str):
+        with self._lock:
+            self._hot.pop(key, None)
+            self._written.pop(key, None)
+            self.db.execute("DELETE FROM states WHERE key = ?", (key,))
+
+    def prune(self, ttl: Optional[float] = None) -> int:
+        """Drop states not saved within ttl seconds (default: the store's ttl); returns how many were removed."""
+        self._pruned = time.time()
+        cutoff = self._pruned - (self.ttl if ttl is None else ttl)
+        with self._lock:
+            stale = [key for (key,) in self.db.execute("SELECT key FROM states WHERE updated < ?", (cutoff,))]
+            self.db.execute("DELETE FROM states WHERE updated < ?", (cutoff,))
+            for key in stale:
+                self._hot.pop(key, None)
+                self._written.pop(key, None)
+        return len(stale)
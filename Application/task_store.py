@@ -0,0 +1,124 @@
+# Standard Libraries
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from instrumentation import span
+
+#
+# Task store
+#
+'''
+Replaces task_list.json, which was rewritten in full after every task and re-read
+right after. Tasks live in SQLite (WAL mode). Every state change is one transaction
+that updates the task row and appends to the task_events journal. A crash therefore
+never leaves a half-written list, and an interrupted run resumes from the tasks that
+are not done yet.
+'''
+TASK_STORE_PATH = os.getenv("TASK_STORE_PATH", os.path.join(os.getcwd(), "task_store.db"))
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+TASK_STATES = (PENDING, RUNNING, DONE, FAILED)
+
+
+class TaskStore:
+    """
+    Parameters:
+    - path (str): SQLite file holding tasks and the journal.
+    - plan_id (str): Namespace for one task list; several plans can share a file.
+    """
+
+    def __init__(self, path: str = TASK_STORE_PATH, plan_id: str = "default"):
+        self.plan_id = plan_id
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS tasks (
+                plan_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL,
+                result TEXT,
+                updated REAL NOT NULL,
+                PRIMARY KEY (plan_id, task_id)
+            );
+            CREATE INDEX IF NOT EXISTS tasks_state ON tasks(plan_id, state, position);
+            CREATE TABLE IF NOT EXISTS task_events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                plan_id TEXT NOT NULL,
+                task_id TEXT,
+                state TEXT NOT NULL,
+                detail TEXT,
+                at REAL NOT NULL
+            );
+        """)
+
+    def _transaction(self, statements):
+        with span("file", "task_store", rows=len(statements)), self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self.db.execute(sql, params)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def load_plan(self, tasks: List[dict]):
+        """Replace this plan's tasks with tasks (all pending), atomically."""
+        now = time.time()
+        statements = [("DELETE FROM tasks WHERE plan_id = ?", (self.plan_id,))]
+        for position, task in enumerate(tasks):
+            statements.append((
+                "INSERT INTO tasks (plan_id, task_id, position, payload, state, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.plan_id, str(task.get("id", position)), position, json.dumps(task), PENDING, now)))
+        statements.append((
+            "INSERT INTO task_events (plan_id, task_id, state, detail, at) VALUES (?, NULL, 'planned', ?, ?)",
+            (self.plan_id, f"{len(tasks)} tasks", now)))
+        self._transaction(statements)
+
+    def mark(self, task_id, state: str, result: Optional[str] = None, detail: Optional[str] = None):
+        """Record a state change for one task (row update plus journal entry in one commit)."""
+        if state not in TASK_STATES:
+            raise ValueError(f"Unknown task state {state!r}, expected one of {TASK_STATES}")
+        now = time.time()
+        self._transaction([
+            ("UPDATE tasks SET state = ?, result = COALESCE(?, result), updated = ? WHERE plan_id = ? AND task_id = ?",
+             (state, result, now, self.plan_id, str(task_id))),
+            ("INSERT INTO task_events (plan_id, task_id, state, detail, at) VALUES (?, ?, ?, ?, ?)",
+             (self.plan_id, str(task_id), state, detail, now)),
+        ])
+
+    def _rows(self, where: str = "", params: tuple = ()):
+        with self._lock:
+            rows = self.db.execute(
+                f"SELECT payload, state, result FROM tasks WHERE plan_id = ?{where} ORDER BY position",
+                (self.plan_id, *params)).fetchall()
+        tasks = []
+        for payload, state, result in rows:
+            task = json.loads(payload)
+            task["state"] = state
+            task["result"] = result
+            tasks.append(task)
+        return tasks
+
+    def tasks(self, state: Optional[str] = None) -> List[dict]:
+        """All tasks of the plan in order, optionally only those in state."""
+        return self._rows(" AND state = ?", (state,)) if state else self._rows()
+
+    def pending(self) -> List[dict]:
+        """Tasks still to run (pending, or running when a previous run was interrupted), in order."""
+        return self._rows(" AND state IN (?, ?)", (PENDING, RUNNING))
+
+    def clear(self):
+        """Delete the plan's tasks and journal, so the objective is planned again from scratch."""
+        self._transaction([
+            ("DELETE FROM tasks WHERE plan_id = ?", (self.plan_id,)),
+            ("DELETE FROM task_events WHERE plan_id = ?", (self.plan_id,)),
+        ])
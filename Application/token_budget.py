@@ -0,0 +1,113 @@
+# Standard Libraries
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Imports related to LangChain
+from langchain.callbacks import get_openai_callback
+
+from instrumentation import span
+from tokens import count_tokens, truncate_tokens
+
+#
+# Prompt token budgeting
+#
+'''
+Every prompt variable is measured with tiktoken before the call. If the rendered prompt
+would not fit the model's context window minus PROMPT_COMPLETION_RESERVE tokens for the
+answer, variables are trimmed in TRIM_ORDER (bulk research text first, splunk_info last).
+Variables not listed in TRIM_ORDER (objective, task, the SPL being edited, task JSON)
+are never cut. Token usage is recorded per chain.
+'''
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-16k": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+}
+PROMPT_COMPLETION_RESERVE = int(os.getenv("PROMPT_COMPLETION_RESERVE", "2000"))
+
+# Lowest priority first
+TRIM_ORDER = ["detection_procedures", "notes", "text", "isolated_context", "results", "schema", "splunk_info"]
+TRUNCATION_MARKER = "\n[... truncated to fit the context window ...]"
+
+
+def context_window(model: str) -> int:
+    if model in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[model]
+    for name, window in sorted(MODEL_CONTEXT_WINDOWS.items(), key=lambda item: -len(item[0])):
+        if model.startswith(name):
+            return window
+    return 4096
+
+
+class TokenBudget:
+    """
+    Fits prompt variables into a model's context window and records per-chain token usage.
+
+    Parameters:
+    - completion_reserve (int): Tokens left free for the answer.
+    - trim_order (list): Variables that may be trimmed, lowest priority first.
+    - limiter: Optional LLMRateLimiter every chain call goes through.
+    """
+
+    def __init__(self, completion_reserve: int = PROMPT_COMPLETION_RESERVE, trim_order: Optional[List[str]] = None,
+                 limiter=None):
+        self.completion_reserve = completion_reserve
+        self.trim_order = trim_order or TRIM_ORDER
+        self.limiter = limiter
+        self.usage: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def fit(self, prompt, inputs: dict, model: str) -> dict:
+        """
+        Return a copy of inputs trimmed so the rendered prompt fits model's window.
+
+        Parameters:
+        - prompt (PromptTemplate): The chain's prompt.
+        - inputs (dict): Values for the prompt variables.
+        - model (str): Model name used to pick the window and tokenizer.
+        """
+        overhead = count_tokens(prompt.format(**{name: "" for name in prompt.input_variables}), model)
+        available = context_window(model) - self.completion_reserve - overhead
+        sizes = {name: count_tokens(str(value), model) for name, value in inputs.items()}
+        excess = sum(sizes.values()) - available
+        if excess <= 0:
+            return inputs
+        fitted = dict(inputs)
+        marker = count_tokens(TRUNCATION_MARKER, model)
+        for name in self.trim_order:
+            if excess <= 0:
+                break
+            if name not in fitted or sizes[name] <= marker:
+                continue
+            keep = max(sizes[name] - excess - marker, 0)
+            fitted[name] = truncate_tokens(str(fitted[name]), keep, model) + TRUNCATION_MARKER
+            excess -= sizes[name] - (keep + marker)
+        return fitted
+
+    def predict(self, chain, name: str, **inputs) -> str:
+        """chain.predict(**inputs) with the inputs fitted to the window and usage recorded under name."""
+        model = getattr(chain.llm, "model_name", "gpt-3.5-turbo")
+        fitted = self.fit(chain.prompt, inputs, model)
+        trimmed = 0
+        if fitted is not inputs:
+            trimmed = sum(count_tokens(str(inputs[k]), model) - count_tokens(str(fitted[k]), model) for k in inputs)
+        start = time.perf_counter()
+        with span("chain", name, model=model) as trace_span, get_openai_callback() as callback:
+            output = self.limiter.call(chain.predict, **fitted) if self.limiter else chain.predict(**fitted)
+            trace_span.set(prompt_tokens=callback.prompt_tokens, completion_tokens=callback.completion_tokens,
+                           trimmed_tokens=max(trimmed, 0))
+        self.record(name, callback.prompt_tokens, callback.completion_tokens, max(trimmed, 0), time.perf_counter() - start)
+        return output
+
+    def record(self, name: str, prompt_tokens: int, completion_tokens: int, trimmed_tokens: int = 0, seconds: float = 0.0):
+        with self._lock:
+            entry = self.usage.setdefault(name, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                                 "trimmed_tokens": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["trimmed_tokens"] += trimmed_tokens
+            entry["seconds"] += seconds
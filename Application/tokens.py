@@ -0,0 +1,31 @@
+# Standard Libraries
+from functools import lru_cache
+
+import tiktoken
+
+#
+# Token counting
+#
+DEFAULT_MODEL = "gpt-3.5-turbo-16k"
+
+
+@lru_cache(maxsize=None)
+def encoding_for(model: str = DEFAULT_MODEL):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Number of tokens text takes for model."""
+    return len(encoding_for(model).encode(text or "", disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    """Cut text down to at most max_tokens tokens."""
+    encoding = encoding_for(model)
+    tokens = encoding.encode(text or "", disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max(max_tokens, 0)])
@@ -0,0 +1,276 @@
+# Standard Libraries
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Vector index
+import faiss
+import numpy as np
+
+# Imports related to LangChain
+from langchain.docstore.base import Docstore
+from langchain.docstore.document import Document
+from langchain.vectorstores import FAISS
+
+from instrumentation import span
+
+#
+# Persistent vector store for Local_Search
+#
+'''
+The FAISS index and the chunk metadata are kept in VECTOR_STORE_DIR:
+  - index.faiss   the raw FAISS index (IndexIDMap over IndexFlatL2), loaded memory-mapped
+  - chunks.db     SQLite table of chunk text/metadata keyed by the FAISS id, plus a
+                  manifest of every ingested source file and its content hash
+Only files whose sha256 changed since the last sync are re-split and re-embedded.
+
+Changes to chunks.db stay in one open transaction until save(), which commits it right
+after index.faiss has been replaced. An ingest that dies half way therefore leaves both
+files as they were, instead of committed rows and source marks without vectors.
+'''
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join(os.getcwd(), "vector_store"))
+INDEX_FILE = "index.faiss"
+CHUNKS_DB = "chunks.db"
+
+
+def file_digest(path: str) -> str:
+    """Return the sha256 hex digest of a file, read in blocks."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class ChunkDocstore(Docstore):
+    """LangChain docstore that reads chunk text from chunks.db on demand instead of holding the corpus in memory."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self):
+        # sqlite connections can't be shared between threads (Streamlit runs each session in its own)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            self._local.conn = conn
+        return conn
+
+    def search(self, search: str):
+        row = self._conn().execute("SELECT text, metadata FROM chunks WHERE id = ?", (int(search),)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+
+class _IdentityIds(dict):
+    """index_to_docstore_id for an IndexIDMap: the FAISS label already is the docstore id."""
+
+    def __missing__(self, key):
+        return str(key)
+
+
+class PersistentVectorStore:
+    """
+    FAISS index plus chunk metadata persisted to a local directory.
+
+    Parameters:
+    - embeddings: LangChain Embeddings used for new chunks and for queries.
+    - store_dir (str): Directory holding index.faiss and chunks.db.
+    """
+
+    def __init__(self, embeddings, store_dir: str = VECTOR_STORE_DIR):
+        self.embeddings = embeddings
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.index_path = os.path.join(store_dir, INDEX_FILE)
+        self.db_path = os.path.join(store_dir, CHUNKS_DB)
+        self.db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks(source);
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                updated REAL NOT NULL
+            );
+        """)
+        self.index = None
+        self._writable = False
+        # FAISS ids present in self.index, built on first use by is_current
+        self._ids = None
+
+    #
+    # Index lifecycle
+    #
+    def load(self, writable: bool = False) -> bool:
+        """Load index.faiss (memory-mapped unless it is about to be modified). Returns False if nothing is persisted yet."""
+        if not os.path.exists(self.index_path):
+            return False
+        flags = 0 if writable else faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        self.index = faiss.read_index(self.index_path, flags)
+        self._writable = writable
+        self._ids = None
+        return True
+
+    def _ensure_writable(self, dim: int):
+        if self.index is not None and self._writable:
+            return
+        if not self.load(writable=True):
+            self.index = faiss.IndexIDMap(faiss.IndexFlatL2(dim))
+            self._writable = True
+
+    def save(self):
+        """
+        Atomically replace index.faiss with the in-memory index, then commit the pending
+        chunk and manifest changes and reopen the index memory-mapped.
+        """
+        if self.index is None or not self._writable:
+            self.db.commit()
+            return
+        tmp_path = self.index_path + ".tmp"
+        with span("file", "vector_store") as trace_span:
+            faiss.write_index(self.index, tmp_path)
+            trace_span.set(bytes=os.path.getsize(tmp_path))
+            os.replace(tmp_path, self.index_path)
+            self.db.commit()
+        self.load()
+
+    def discard(self):
+        """Roll back the uncommitted chunk and manifest changes and drop the in-memory index changes."""
+        self.db.rollback()
+        self.index = None
+        self._writable = False
+        self._ids = None
+
+    #
+    # Manifest
+    #
+    def source_digest(self, source: str) -> Optional[str]:
+        row = self.db.execute("SELECT sha256 FROM sources WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def sources(self) -> Dict[str, str]:
+        return dict(self.db.execute("SELECT source, sha256 FROM sources"))
+
+    def _indexed_ids(self) -> set:
+        if self._ids is None:
+            if self.index is None and not self.load():
+                return set()
+            self._ids = set(faiss.vector_to_array(self.index.id_map).tolist())
+        return self._ids
+
+    def is_current(self, source: str, digest: str) -> bool:
+        """True if source was ingested with this digest and every one of its chunks has a vector in the index."""
+        row = self.db.execute("SELECT sha256, chunk_count FROM sources WHERE source = ?", (source,)).fetchone()
+        if row is None or row[0] != digest:
+            return False
+        ids = [chunk_id for (chunk_id,) in self.db.execute("SELECT id FROM chunks WHERE source = ?", (source,))]
+        if len(ids) != row[1]:
+            return False
+        if not ids:
+            return True
+        indexed = self._indexed_ids()
+        return all(chunk_id in indexed for chunk_id in ids)
+
+    def remove_source(self, source: str):
+        """Drop every chunk (and its vector) that came from source."""
+        ids = [row[0] for row in self.db.execute("SELECT id FROM chunks WHERE source = ?", (source,))]
+        if ids:
+            if self.index is not None or self.load(writable=True):
+                self._ensure_writable(self.index.d)
+                self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+                if self._ids is not None:
+                    self._ids.difference_update(ids)
+            self.db.execute("DELETE FROM chunks WHERE source = ?", (source,))
+        self.db.execute("DELETE FROM sources WHERE source = ?", (source,))
+
+    def add_chunks(self, source: str, texts: List[str], metadatas: Optional[List[dict]] = None) -> int:
+        """Embed one batch of chunks from a single source and append them to the index."""
+        metadatas = metadatas or [{"source": source} for _ in texts]
+        return self.add_batch([(source, text, metadata) for text, metadata in zip(texts, metadatas)])
+
+    def add_batch(self, items: List[tuple]) -> int:
+        """
+        Embed a batch of (source, text, metadata) chunks with a single embeddings call and append them to the index.
+
+        Returns:
+        - int: Number of chunks added.
+        """
+        if not items:
+            return 0
+        vectors = np.asarray(self.embeddings.embed_documents([text for _, text, _ in items]), dtype=np.float32)
+        self._ensure_writable(vectors.shape[1])
+        ids = []
+        for source, text, metadata in items:
+            cursor = self.db.execute(
+                "INSERT INTO chunks (source, text, metadata) VALUES (?, ?, ?)",
+                (source, text, json.dumps(metadata)))
+            ids.append(cursor.lastrowid)
+        self.index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+        if self._ids is not None:
+            self._ids.update(ids)
+        return len(ids)
+
+    def mark_source(self, source: str, digest: str):
+        count = self.db.execute("SELECT COUNT(*) FROM chunks WHERE source = ?", (source,)).fetchone()[0]
+        self.db.execute(
+            "INSERT OR REPLACE INTO sources (source, sha256, chunk_count, updated) VALUES (?, ?, ?, ?)",
+            (source, digest, count, time.time()))
+
+    #
+    # Sync
+    #
+    def sync(self, paths: Iterable[str], text_splitter, loader_factory, prune: bool = False) -> Dict[str, int]:
+        """
+        Bring the store up to date with a set of files.
+
+        Parameters:
+        - paths: Files that make up the corpus.
+        - text_splitter: LangChain text splitter used to chunk changed files.
+        - loader_factory: Callable returning a LangChain document loader for a path.
+        - prune (bool): Also drop sources that are no longer in paths.
+
+        Returns:
+        - dict: Counts of unchanged, updated and removed files.
+        """
+        stats = {"unchanged": 0, "updated": 0, "removed": 0}
+        wanted = set()
+        for path in paths:
+            source = os.path.abspath(path)
+            wanted.add(source)
+            digest = file_digest(path)
+            if self.is_current(source, digest):
+                stats["unchanged"] += 1
+                continue
+            self.remove_source(source)
+            docs = text_splitter.split_documents(loader_factory(path).load())
+            self.add_chunks(source, [d.page_content for d in docs], [d.metadata for d in docs])
+            self.mark_source(source, digest)
+            stats["updated"] += 1
+        if prune:
+            for source in set(self.sources()) - wanted:
+                self.remove_source(source)
+                stats["removed"] += 1
+        if stats["updated"] or stats["removed"]:
+            self.save()
+        elif self.index is None:
+            self.load()
+        return stats
+
+    def as_faiss(self) -> FAISS:
+        """Wrap the persisted index as a LangChain FAISS vector store."""
+        if self.index is None and not self.load():
+            raise ValueError(f"No vector index persisted in {self.store_dir}")
+        return FAISS(self.embeddings.embed_query, self.index, ChunkDocstore(self.db_path), _IdentityIds())